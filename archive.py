@@ -0,0 +1,348 @@
+"""
+SQLite archive of the generated quotes.
+
+Every rendered quote is stored with its client, lines, totals, currency, the
+settings used and the path of the PDF, so it can be found and re-rendered
+later without searching the filesystem.
+
+    archive = QuoteArchive("quotes.db")
+    archive.record(invoice_data, client, settings, file_path)
+    archive.find(client="dupont")           # newest first
+    archive.get("2026-000042")              # full record, invoice_data included
+    archive.reopen("2026-000042")           # PDF bytes, re-rendered if the file is gone
+
+Command line:
+    python archive.py find --client dupont --since 2026-01-01
+    python archive.py show 2026-000042
+    python archive.py reopen 2026-000042 -o copy.pdf
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = "quotes.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    reference TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL,
+    invoice_date TEXT,
+    client_name TEXT NOT NULL,
+    client_nif TEXT,
+    client_rc TEXT,
+    client_json TEXT NOT NULL,
+    currency TEXT,
+    sub_total REAL,
+    tax_amount REAL,
+    discount_amount REAL,
+    delivery_cost REAL,
+    grand_total REAL,
+    line_count INTEGER NOT NULL,
+    output_path TEXT,
+    invoice_json TEXT NOT NULL,
+    settings_json TEXT
+);
+CREATE TABLE IF NOT EXISTS quote_lines (
+    quote_id INTEGER NOT NULL REFERENCES quotes(id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    model TEXT,
+    variant TEXT,
+    qty INTEGER,
+    colors_json TEXT,
+    unit_price REAL,
+    total REAL,
+    PRIMARY KEY (quote_id, line_no)
+);
+CREATE INDEX IF NOT EXISTS quotes_client_name ON quotes (client_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS quotes_client_nif ON quotes (client_nif);
+CREATE INDEX IF NOT EXISTS quotes_client_rc ON quotes (client_rc);
+CREATE INDEX IF NOT EXISTS quotes_created_at ON quotes (created_at);
+CREATE INDEX IF NOT EXISTS quotes_output_path ON quotes (output_path);
+"""
+
+# billTo fields that build_invoice_data prefixes with a label
+LABELLED_CLIENT_FIELDS = ("nif", "nis", "rc", "article")
+
+# invoiceDetails fields that differ between two renderings of the same quote
+VOLATILE_DETAILS = ("accountNo", "invoiceDate", "issueDate")
+
+# Columns returned by find()
+SUMMARY_COLUMNS = ["reference", "created_at", "invoice_date", "client_name", "client_nif", "client_rc",
+                   "currency", "grand_total", "line_count", "output_path"]
+
+
+def client_from_bill_to(bill_to):
+    """Client fields of invoice_data['billTo'] without their 'NIF: ' style labels."""
+    return {
+        key: value.split(": ", 1)[1] if key in LABELLED_CLIENT_FIELDS and ": " in value else value
+        for key, value in bill_to.items()
+    }
+
+
+def quote_content(invoice_data):
+    """
+    invoice_data without its reference and dates, in the form it is archived:
+    equal for two renderings of the same quote.
+    """
+    content = dict(invoice_data)
+    content["invoiceDetails"] = {
+        key: value for key, value in invoice_data.get("invoiceDetails", {}).items() if key not in VOLATILE_DETAILS
+    }
+    # Tuples become lists and quantities numbers, as read back by get()
+    content["items"] = [dict(item, qty=int(item["qty"])) if str(item.get("qty", "")).isdigit() else item
+                        for item in invoice_data.get("items", [])]
+    return json.loads(json.dumps(content, ensure_ascii=False, default=str))
+
+
+class QuoteArchive:
+    def __init__(self, path=ARCHIVE_FILE):
+        self.path = path
+        # One connection shared by the threads of a process, calls are serialized
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            # WAL lets readers work while a batch worker writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA foreign_keys=ON")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def record(self, invoice_data, client=None, settings=None, output_path=None):
+        """
+        Stores a rendered quote. A quote already archived under the same reference
+        is only replaced by a new rendering of the same content (see quote_content()).
+        The file of output_path now belongs to this quote, older quotes written there
+        lose their output_path and reopen() renders them again.
+
+        :param client: Bill-to details as entered, read back from invoice_data when None
+        :return: Row id of the quote
+        :raises ValueError: The reference is archived with a different content
+        """
+        reference = invoice_data["invoiceDetails"]["accountNo"]
+        if not self.matches(reference, invoice_data, missing=True):
+            raise ValueError(f"Quote {reference} is already archived with a different content")
+        if client is None:
+            client = client_from_bill_to(invoice_data.get("billTo", {}))
+        totals = invoice_data["totals"]
+        items = invoice_data["items"]
+        # Lines go to their own table, the rest of invoice_data is kept as JSON
+        header = {key: value for key, value in invoice_data.items() if key != "items"}
+        row = (
+            invoice_data["invoiceDetails"]["accountNo"],
+            datetime.now().isoformat(timespec="seconds"),
+            invoice_data["invoiceDetails"].get("invoiceDate"),
+            client.get("name", "").strip(),
+            client.get("nif", "").strip(),
+            client.get("rc", "").strip(),
+            json.dumps(client, ensure_ascii=False),
+            totals.get("currencySign"),
+            totals.get("subTotal"),
+            totals.get("taxAmount"),
+            totals.get("discountAmount"),
+            totals.get("deliveryCost"),
+            totals.get("grandTotal"),
+            len(items),
+            os.path.abspath(output_path) if output_path else None,
+            json.dumps(header, ensure_ascii=False),
+            json.dumps(settings, ensure_ascii=False) if settings is not None else None,
+        )
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM quotes WHERE reference = ?", (row[0],))
+            if row[14]:
+                self._connection.execute("UPDATE quotes SET output_path = NULL WHERE output_path = ?", (row[14],))
+            cursor = self._connection.execute(
+                "INSERT INTO quotes (reference, created_at, invoice_date, client_name, client_nif, client_rc, "
+                "client_json, currency, sub_total, tax_amount, discount_amount, delivery_cost, grand_total, "
+                "line_count, output_path, invoice_json, settings_json) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            quote_id = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT INTO quote_lines (quote_id, line_no, model, variant, qty, colors_json, unit_price, total) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (quote_id, line_no, item.get("model"), item.get("variant"), item.get("qty"),
+                     json.dumps(item.get("colors", []), ensure_ascii=False), item.get("unitPrice"), item.get("total"))
+                    for line_no, item in enumerate(items, start=1)
+                ))
+        logger.debug("Archived quote %s (%d lines)", row[0], len(items))
+        return quote_id
+
+    def matches(self, reference, invoice_data, missing=False):
+        """
+        True when the quote archived under reference has the content of invoice_data.
+
+        :param missing: Returned when reference is not archived
+        """
+        record = self.get(reference)
+        if record is None:
+            return missing
+        return quote_content(record["invoice_data"]) == quote_content(invoice_data)
+
+    def record_safely(self, *args, **kwargs):
+        """record() for callers that must not fail because of the archive, errors are logged."""
+        try:
+            return self.record(*args, **kwargs)
+        except (sqlite3.Error, KeyError, TypeError, ValueError):
+            metrics.inc("archive_errors_total")
+            logger.exception("Could not archive quote")
+            return None
+
+    def find(self, reference=None, client=None, nif=None, rc=None, since=None, until=None, limit=50):
+        """
+        Summaries of the matching quotes, newest first.
+
+        :param reference: Reference or its beginning
+        :param client: Beginning of the client name, case-insensitive
+        :param since: Earliest creation date, 'YYYY-MM-DD'
+        :param until: Latest creation date, 'YYYY-MM-DD' (inclusive)
+        """
+        conditions = []
+        parameters = []
+        # Prefix matches use ranges so the indexes apply
+        if reference:
+            conditions.append("reference >= ? AND reference < ?")
+            parameters += [reference, reference + "\uffff"]
+        if client:
+            conditions.append("client_name >= ? COLLATE NOCASE AND client_name < ? COLLATE NOCASE")
+            parameters += [client, client + "\uffff"]
+        if nif:
+            conditions.append("client_nif = ?")
+            parameters.append(nif)
+        if rc:
+            conditions.append("client_rc = ?")
+            parameters.append(rc)
+        if since:
+            conditions.append("created_at >= ?")
+            parameters.append(since)
+        if until:
+            conditions.append("created_at < ?")
+            parameters.append(until + "\uffff")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM quotes {where} ORDER BY created_at DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._connection.execute(query, parameters + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def reference_for_path(self, output_path):
+        """Reference of the newest quote written to output_path, None when there is none."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT reference FROM quotes WHERE output_path = ? ORDER BY id DESC LIMIT 1",
+                (os.path.abspath(output_path),)).fetchone()
+        return row[0] if row else None
+
+    def get(self, reference):
+        """
+        Full record of a quote, None when unknown.
+        invoice_data is rebuilt as it was rendered, lines included.
+        """
+        with self._lock:
+            quote = self._connection.execute("SELECT * FROM quotes WHERE reference = ?", (reference,)).fetchone()
+            if quote is None:
+                return None
+            lines = self._connection.execute(
+                "SELECT model, variant, qty, colors_json, unit_price, total FROM quote_lines "
+                "WHERE quote_id = ? ORDER BY line_no", (quote["id"],)).fetchall()
+        record = dict(quote)
+        invoice_data = json.loads(record.pop("invoice_json"))
+        invoice_data["items"] = [
+            {
+                "model": line["model"],
+                "variant": line["variant"],
+                "qty": line["qty"],
+                "colors": json.loads(line["colors_json"]),
+                "unitPrice": line["unit_price"],
+                "total": line["total"]
+            }
+            for line in lines
+        ]
+        record["invoice_data"] = invoice_data
+        record["client"] = json.loads(record.pop("client_json"))
+        settings_json = record.pop("settings_json")
+        record["settings"] = json.loads(settings_json) if settings_json else None
+        return record
+
+    def reopen(self, reference):
+        """
+        Returns the PDF of a quote: the saved file when it still exists,
+        else a new rendering of the archived invoice_data. None when unknown.
+        """
+        record = self.get(reference)
+        if record is None:
+            return None
+        output_path = record["output_path"]
+        if output_path and os.path.exists(output_path):
+            with open(output_path, "rb") as f:
+                return f.read()
+        from create_pdf import PDFGenerator
+        return PDFGenerator().create_pdf(record["invoice_data"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search and reopen archived quotes.")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help=f"Archive file (default: {ARCHIVE_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    find_parser = commands.add_parser("find", help="List matching quotes, newest first")
+    find_parser.add_argument("--reference", help="Reference or its beginning")
+    find_parser.add_argument("--client", help="Beginning of the client name")
+    find_parser.add_argument("--nif")
+    find_parser.add_argument("--rc")
+    find_parser.add_argument("--since", help="YYYY-MM-DD")
+    find_parser.add_argument("--until", help="YYYY-MM-DD")
+    find_parser.add_argument("--limit", type=int, default=50)
+
+    show_parser = commands.add_parser("show", help="Print a quote as JSON")
+    show_parser.add_argument("reference")
+
+    reopen_parser = commands.add_parser("reopen", help="Write the PDF of a quote")
+    reopen_parser.add_argument("reference")
+    reopen_parser.add_argument("-o", "--output", help="Output file (default: <reference>.pdf)")
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.archive):
+        print(f"Archive not found: {args.archive}")
+        return 2
+    archive = QuoteArchive(args.archive)
+
+    if args.command == "find":
+        for quote in archive.find(args.reference, args.client, args.nif, args.rc, args.since, args.until, args.limit):
+            print(f"{quote['reference']}  {quote['created_at']}  {quote['client_name']:<30} "
+                  f"{quote['grand_total']:>12.2f} {quote['currency']}  {quote['line_count']} lines  {quote['output_path']}")
+        return 0
+
+    if args.command == "show":
+        record = archive.get(args.reference)
+        if record is None:
+            print(f"Unknown quote: {args.reference}")
+            return 1
+        print(json.dumps(record, ensure_ascii=False, indent=4))
+        return 0
+
+    pdf_bytes = archive.reopen(args.reference)
+    if pdf_bytes is None:
+        print(f"Unknown quote: {args.reference}")
+        return 1
+    output = args.output or f"{args.reference}.pdf"
+    with open(output, "wb") as f:
+        f.write(pdf_bytes)
+    print(f"Written {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
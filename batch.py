@@ -0,0 +1,340 @@
+"""
+Headless batch quotation generator.
+
+Reads orders from a JSONL or CSV file, prices them with the same rules as
+the GUI form and renders one PDF per order across a pool of processes.
+
+JSONL: one order per line
+    {"id": "A-1",
+     "client": {"name": "...", "addressLine1": "...", "addressLine2": "", "phone": "...",
+                "email": "...", "nif": "...", "nis": "...", "rc": "...", "article": "..."},
+     "lines": [{"model": "Square", "variant": "Rhodes", "qty": 2, "colors": ["..."]}]}
+A line that is not a JSON object is reported as a failed order, identified
+by its line number, and the run goes on.
+
+CSV: semicolon-delimited, one row per order line, rows sharing the same
+order_id are grouped into one quote
+    order_id;name;addressLine1;addressLine2;phone;email;nif;nis;rc;article;model;variant;qty;color1;color2;color3;color4;color5
+
+Orders are priced and validated first. Those without a "reference" then
+receive consecutive quote numbers, reserved in one transaction before
+rendering (see numbering.py); a rejected order receives no number and the
+numbers of orders that failed to render are given back. An order whose PDF
+was already written to the output folder with the same content keeps the
+reference archived for it (an order that only has the same id and client
+gets a new number), so with the PDF cache (see pdf_cache.py) re-running a partially failed
+batch only renders the orders that failed. Every rendered quote is recorded in the quote archive (quotes.db, see
+archive.py) unless --no-archive is given.
+
+Usage:
+    python batch.py orders.jsonl --output PDF --workers 4
+"""
+import argparse
+import copy
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from archive import QuoteArchive, ARCHIVE_FILE
+from catalog import catalog
+from create_pdf import PDFGenerator, register_fonts
+from metrics import metrics, configure_logging
+from numbering import get_allocator, NUMBERING_FILE
+from pdf_cache import PDFCache, CACHE_DIR, DEFAULT_MAX_MB
+from pricing import price_entries, validate_lines
+from quote import load_settings, build_invoice_data, validate_order, REQUIRED_CLIENT_FIELDS
+
+CLIENT_COLUMNS = REQUIRED_CLIENT_FIELDS + ["addressLine2"]
+COLOR_COLUMNS = [f"color{i}" for i in range(1, 6)]
+
+# Settings shared by every order rendered in a worker process
+_worker_settings = None
+# Archive connection of the worker process, None when archiving is off
+_worker_archive = None
+# PDF cache of the worker process, None when caching is off
+_worker_cache = None
+
+
+def read_orders_jsonl(path):
+    orders = []
+    with open(path, mode='r', encoding='utf-8') as file:
+        for line_no, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                order = json.loads(line)
+            except json.JSONDecodeError as e:
+                # Reported as a failed order, the other lines are still rendered
+                orders.append({"id": str(line_no), "read_error": f"Invalid JSON on line {line_no}: {e}"})
+                continue
+            if not isinstance(order, dict):
+                orders.append({"id": str(line_no), "read_error": f"Line {line_no} is not a JSON object"})
+                continue
+            order.setdefault("id", str(line_no))
+            orders.append(order)
+    return orders
+
+
+def read_orders_csv(path):
+    orders = {}
+    with open(path, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.DictReader(file, delimiter=';')
+        for row in reader:
+            order_id = row.get("order_id") or str(reader.line_num)
+            order = orders.get(order_id)
+            if order is None:
+                client = {column: row.get(column) or "" for column in CLIENT_COLUMNS}
+                order = orders[order_id] = {"id": order_id, "client": client, "lines": []}
+            order["lines"].append({
+                "model": row.get("model") or "",
+                "variant": row.get("variant") or "",
+                "qty": row.get("qty") or "1",
+                "colors": [row.get(column) or "" for column in COLOR_COLUMNS]
+            })
+    return list(orders.values())
+
+
+def read_orders(path):
+    if path.lower().endswith(".csv"):
+        return read_orders_csv(path)
+    return read_orders_jsonl(path)
+
+
+def output_filename(order_id, client_name):
+    safe_name = re.sub(r"[^\w\-]+", "_", f"{order_id}_{client_name}").strip("_")
+    return f"{safe_name}_PDF_Output.pdf"
+
+
+def order_output_path(order, output_dir):
+    client_name = order.get("client", {}).get("name", "")
+    return os.path.join(output_dir, output_filename(str(order.get("id")), client_name))
+
+
+def _init_worker(settings, archive_path=None, cache_dir=None, cache_mb=DEFAULT_MAX_MB):
+    global _worker_settings, _worker_archive, _worker_cache
+    _worker_settings = settings
+    # Each process opens its own connection, SQLite serializes the writers
+    if archive_path:
+        _worker_archive = QuoteArchive(archive_path)
+    if cache_dir:
+        _worker_cache = PDFCache(cache_dir, cache_mb * 1024 * 1024)
+    # Parse the TTF files and catalogs once per worker instead of once per order
+    register_fonts()
+    catalog.load_all()
+
+
+def price_orders(orders):
+    """
+    Checks the lines against the catalogs, prices and validates the orders before
+    they receive a quote number, so a rejected order does not use one.
+
+    :return: Tuple (orders with their priced "entries", list of (order_id, error))
+    """
+    priced = []
+    rejected = []
+    for order in orders:
+        try:
+            validate_lines(order.get("lines", []))
+            entries = price_entries(order.get("lines", []))
+            validate_order(order.get("client", {}), entries)
+        except Exception as e:
+            rejected.append((str(order.get("id")), f"{type(e).__name__}: {e}"))
+            continue
+        priced.append(dict(order, entries=entries))
+    return priced, rejected
+
+
+def render_order(order, output_dir, settings=None):
+    """
+    Renders one order, priced by price_orders() or here.
+
+    :return: Tuple (order_id, file_path, error message or None, stage timings, metrics delta)
+    """
+    order_id = str(order.get("id"))
+    with metrics.collect() as timings, metrics.collect_delta() as delta:
+        try:
+            settings = settings or _worker_settings
+            client = order.get("client", {})
+            entries = order.get("entries")
+            if entries is None:
+                entries = price_entries(order.get("lines", []))
+            invoice_data = build_invoice_data(settings, client, entries, invoice_no=order.get("reference"))
+            file_path = order_output_path(order, output_dir)
+            if _worker_cache is not None:
+                pdf_bytes = _worker_cache.render(invoice_data)
+                with open(file_path, "wb") as f:
+                    f.write(pdf_bytes)
+            else:
+                PDFGenerator(file_path).create_pdf(invoice_data)
+            if _worker_archive is not None:
+                _worker_archive.record_safely(invoice_data, client, settings, file_path)
+            error = None
+        except Exception as e:
+            file_path, error = None, f"{type(e).__name__}: {e}"
+    return order_id, file_path, error, timings, delta
+
+
+def _invoice_data(order, settings, reference):
+    """invoice_data the order will be rendered with under reference."""
+    entries = order.get("entries")
+    if entries is None:
+        entries = price_entries(order.get("lines", []))
+    # build_invoice_data converts the entries in place
+    return build_invoice_data(settings, order.get("client", {}), copy.deepcopy(entries), invoice_no=reference)
+
+
+def assign_references(orders, numbering_path=NUMBERING_FILE, output_dir=None, archive_path=None, settings=None):
+    """
+    Gives a quote number to every order without a reference, in one reservation.
+    With an archive and the settings, an order whose PDF in output_dir was archived
+    keeps its reference when the archived quote has the same content.
+
+    :return: Tuple (orders with their reference, list of the references reserved),
+             the original dictionaries are not modified
+    """
+    missing = [i for i, order in enumerate(orders) if not order.get("reference")]
+    if not missing:
+        return orders, []
+    orders = list(orders)
+    if archive_path and output_dir and settings is not None:
+        archive = QuoteArchive(archive_path)
+        try:
+            still_missing = []
+            for i in missing:
+                order = orders[i]
+                reference = archive.reference_for_path(order_output_path(order, output_dir))
+                if reference and archive.matches(reference, _invoice_data(order, settings, reference)):
+                    orders[i] = dict(order, reference=reference)
+                else:
+                    still_missing.append(i)
+            missing = still_missing
+        finally:
+            archive.close()
+    references = []
+    if missing:
+        references = get_allocator(numbering_path).references(len(missing))
+        for i, reference in zip(missing, references):
+            orders[i] = dict(orders[i], reference=reference)
+    return orders, references
+
+
+def run_batch(orders, output_dir, settings, workers=None, progress_every=50, archive_path=None,
+              numbering_path=NUMBERING_FILE, cache_dir=None, cache_mb=DEFAULT_MAX_MB):
+    """
+    Renders every order across a process pool, never stopping on a failed order.
+    Quote numbers are only reserved for orders that priced and validated, the
+    numbers of orders that failed to render are given back.
+
+    :param archive_path: Quote archive recording the rendered orders, None to keep no record
+    :param numbering_path: Numbering file the missing references are reserved from
+    :param cache_dir: PDF cache directory, None to render every order
+
+    :return: Tuple (list of generated file paths, list of (order_id, error))
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    generated = []
+    failures = []
+
+    def fail(order_id, error):
+        metrics.inc("batch_failures_total")
+        failures.append((order_id, error))
+        print(f"Order {order_id} failed: {error}")
+
+    # Lines of the orders file that could not be read
+    for order in orders:
+        if "read_error" in order:
+            fail(str(order["id"]), order["read_error"])
+    orders, rejected = price_orders([order for order in orders if "read_error" not in order])
+    for order_id, error in rejected:
+        fail(order_id, error)
+    orders, reserved = assign_references(orders, numbering_path, output_dir, archive_path, settings)
+    reserved = set(reserved)
+    unused = []
+    total = len(orders)
+    start = time.perf_counter()
+
+    def report(done):
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        print(f"[{done}/{total}] {rate:.1f} quotes/sec, {len(failures)} failed")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(settings, archive_path, cache_dir, cache_mb)) as executor:
+        futures = {executor.submit(render_order, order, output_dir): order for order in orders}
+        for done, future in enumerate(as_completed(futures), start=1):
+            order_id, file_path, error, timings, delta = future.result()
+            # Stage times and counters were measured in the worker process
+            metrics.record_stages(timings)
+            metrics.merge(delta)
+            if error:
+                fail(order_id, error)
+                if futures[future]["reference"] in reserved:
+                    unused.append(futures[future]["reference"])
+            else:
+                generated.append(file_path)
+            if done % progress_every == 0 or done == total:
+                report(done)
+
+    # Numbers of the orders that failed go to the next quotes, the references stay gap-free
+    if unused:
+        get_allocator(numbering_path).release_references(unused)
+    return generated, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate quotation PDFs for a file of orders.")
+    parser.add_argument("orders", help="Orders file (.jsonl or semicolon-delimited .csv)")
+    parser.add_argument("-o", "--output", default="PDF", help="Output folder (default: PDF)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--settings", default="settings.json", help="Settings file (default: settings.json)")
+    parser.add_argument("--failures", help="Write failed orders to this JSONL file")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help=f"Quote archive (default: {ARCHIVE_FILE})")
+    parser.add_argument("--no-archive", action="store_true", help="Do not record the quotes in the archive")
+    parser.add_argument("--numbering", default=NUMBERING_FILE,
+                        help=f"Quote numbering file (default: {NUMBERING_FILE})")
+    parser.add_argument("--cache", default=CACHE_DIR, help=f"PDF cache folder (default: {CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_MB,
+                        help=f"PDF cache size in MB (default: {DEFAULT_MAX_MB})")
+    parser.add_argument("--no-cache", action="store_true", help="Render every order, ignoring the PDF cache")
+    parser.add_argument("--metrics", help="Write stage timings and counters to this JSON file")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR (default: $QUOTE_LOG_LEVEL or INFO)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    settings = load_settings(args.settings)
+    if settings is None:
+        print(f"Settings file not found: {args.settings}")
+        return 2
+
+    orders = read_orders(args.orders)
+    print(f"Rendering {len(orders)} orders with {args.workers} workers")
+
+    start = time.perf_counter()
+    archive_path = None if args.no_archive else args.archive
+    generated, failures = run_batch(orders, args.output, settings, workers=args.workers, archive_path=archive_path,
+                                    numbering_path=args.numbering,
+                                    cache_dir=None if args.no_cache else args.cache, cache_mb=args.cache_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"Generated {len(generated)} PDFs in {elapsed:.2f}s "
+          f"({len(generated) / elapsed if elapsed > 0 else 0.0:.1f} quotes/sec), {len(failures)} failed")
+
+    if failures and args.failures:
+        with open(args.failures, "w", encoding="utf-8") as f:
+            for order_id, error in failures:
+                f.write(json.dumps({"id": order_id, "error": error}, ensure_ascii=False) + "\n")
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.to_json(indent=4))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Benchmarks for catalog loading, pricing and PDF rendering.
+
+Every case is timed on its own (best and median of --repeat runs), then run
+once more under tracemalloc for its peak memory. PDFs are rendered in memory,
+nothing is written besides the optional baseline file.
+
+Usage:
+    python bench.py                          # run and print the results
+    python bench.py --save                   # also store them as the baseline
+    python bench.py --compare                # fail when slower than the baseline
+    python bench.py --sizes 1 50 --repeat 5 --threshold 0.1
+
+A case regresses when its best time or peak memory exceeds the baseline by
+more than --threshold (default 20%). Baselines are only comparable on the
+same machine.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from catalog import CatalogRegistry, catalog, COLORS
+from create_pdf import PDFGenerator, register_fonts
+from metrics import configure_logging
+from pricing import PricingEngine, MAX_COLORS
+from quote import load_settings, build_invoice_data
+
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_SIZES = [1, 50, 1000, 10000]
+DEFAULT_THRESHOLD = 0.2
+
+BENCH_CLIENT = {
+    "name": "Benchmark Client",
+    "addressLine1": "1 Rue du Test",
+    "addressLine2": "06000 Bejaia",
+    "phone": "+213 555 00 00 00",
+    "email": "bench@example.com",
+    "nif": "000000000000000",
+    "nis": "000000000000000",
+    "rc": "00/00-0000000 B 00",
+    "article": "00000000000"
+}
+
+
+def make_lines(count, seed=42):
+    """Reproducible order lines picked from the real catalogs."""
+    rng = random.Random(seed)
+    families = catalog.families()
+    colors = catalog.colors()
+    lines = []
+    for _ in range(count):
+        family = rng.choice(families)
+        lines.append({
+            "model": family,
+            "variant": rng.choice(catalog.variants(family)),
+            "qty": rng.randint(1, 50),
+            "colors": rng.sample(colors, rng.randint(0, MAX_COLORS))
+        })
+    return lines
+
+
+def measure(func, repeat):
+    """
+    Runs func repeat times for timing, then once under tracemalloc.
+
+    :return: Dict with best and median seconds, peak memory in bytes and the last result
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"best": min(times), "median": statistics.median(times), "peak": peak, "result": result}
+
+
+def bench_catalog_load(repeat, use_snapshots=True):
+    def load():
+        registry = CatalogRegistry(use_snapshots=use_snapshots)
+        registry.load_all()
+        return sum(len(registry.get(name)) for name in registry.families() + [COLORS])
+    stats = measure(load, repeat)
+    stats["references"] = stats.pop("result")
+    return stats
+
+
+def bench_pricing(lines, repeat):
+    # A new engine every run, so memoized combinations do not hide the catalog lookups
+    stats = measure(lambda: PricingEngine().price_lines(lines), repeat)
+    stats.pop("result")
+    return stats
+
+
+def bench_render(lines, settings, repeat):
+    entries = PricingEngine().price_lines(lines).entries()
+    invoice_data = build_invoice_data(settings, BENCH_CLIENT, entries, invoice_no="BENCH")
+    stats = measure(lambda: PDFGenerator().create_pdf(invoice_data), repeat)
+    stats["size"] = len(stats.pop("result"))
+    return stats
+
+
+def run(sizes, repeat, settings):
+    # Fonts and catalogs are loaded once up front, like in a warmed-up worker
+    register_fonts()
+    catalog.load_all()
+
+    results = {
+        "catalog_load_csv": bench_catalog_load(repeat, use_snapshots=False),
+        "catalog_load": bench_catalog_load(repeat),
+    }
+    for size in sizes:
+        lines = make_lines(size)
+        results[f"pricing_{size}"] = bench_pricing(lines, repeat)
+        results[f"render_{size}"] = bench_render(lines, settings, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: List of regression descriptions, empty when everything is within threshold
+    """
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("best", "peak"):
+            if previous[metric] > 0 and stats[metric] > previous[metric] * (1 + threshold):
+                change = stats[metric] / previous[metric] - 1
+                regressions.append(f"{name} {metric}: {previous[metric]:.4g} -> {stats[metric]:.4g} (+{change:.0%})")
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f"{'case':<18}{'best ms':>10}{'median ms':>11}{'peak KiB':>11}{'size KiB':>10}{'vs base':>9}")
+    for name, stats in results.items():
+        size = f"{stats['size'] / 1024:.1f}" if "size" in stats else ""
+        change = ""
+        if baseline and name in baseline and baseline[name]["best"] > 0:
+            change = f"{stats['best'] / baseline[name]['best'] - 1:+.0%}"
+        print(f"{name:<18}{stats['best'] * 1000:>10.2f}{stats['median'] * 1000:>11.2f}"
+              f"{stats['peak'] / 1024:>11.1f}{size:>10}{change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark catalog loading, pricing and PDF rendering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of order lines")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (default: 3)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"Baseline file (default: {BASELINE_FILE})")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Exit with 1 when a case regressed")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before a case counts as regressed (default: 0.2 = 20%%)")
+    parser.add_argument("--settings", default="settings.json", help="Settings file (default: settings.json)")
+    parser.add_argument("--log-level", default="WARNING", help="Log level while benchmarking (default: WARNING)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    settings = load_settings(args.settings)
+    if settings is None:
+        print(f"Settings file not found: {args.settings}")
+        return 2
+
+    baseline = None
+    try:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        pass
+
+    results = run(args.sizes, args.repeat, settings)
+    print_results(results, baseline)
+
+    status = 0
+    if args.compare:
+        if baseline is None:
+            print(f"No baseline in {args.baseline}, run with --save first")
+            status = 2
+        else:
+            regressions = compare(results, baseline, args.threshold)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                status = 1
+            else:
+                print(f"No regression above {args.threshold:.0%}")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "results": results
+            }, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from model import Model
+from color import Couleur
+from search import SearchIndex
+from snapshot import open_snapshot, snapshot_path, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Product family (as shown in the GUI) -> CSV file
+MODEL_FILES = {
+    "Square": "CSV/CSV_Modeles_Carre.csv",
+    "Hexagonal": "CSV/CSV_Modeles_Hexa.csv",
+    "Frieze": "CSV/CSV_Modeles_Frise.csv",
+    "Berber Carpet": "CSV/CSV_Modeles_Tapis.csv",
+    "Baguettes": "CSV/CSV_Modeles_Baguettes.csv",
+}
+
+# Registry name of the colour catalog
+COLORS = "Couleur"
+COLOR_FILE = "CSV/CSV_Couleur.csv"
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    family: str
+    name: str   # display name, without the stray spaces of the CSV
+    key: str    # normalized name used for lookups
+    price: float
+
+
+class Catalog:
+    """One parsed CSV file: entries by normalized name and display names in file order."""
+    def __init__(self, family, entries, errors):
+        self.family = family
+        self.entries = entries
+        self.names = [entry.name for entry in entries.values()]
+        self.errors = errors
+        self._search_index = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find(self, key):
+        """CatalogEntry with this normalized name, None when absent."""
+        return self.entries.get(key)
+
+    @property
+    def search_index(self):
+        """Type-ahead index, built on first use (a reloaded catalog gets a new one)."""
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.names)
+        return self._search_index
+
+
+class SnapshotCatalog(Catalog):
+    """
+    Catalog backed by a memory-mapped snapshot, see snapshot.py.
+    Rows are only decoded when they are used, names and entries on first access.
+    """
+    def __init__(self, family, snapshot):
+        self.family = family
+        self.snapshot = snapshot
+        self._names = None
+        self._entries = None
+        self._search_index = None
+
+    def __len__(self):
+        return self.snapshot.count
+
+    def _entry(self, i):
+        return CatalogEntry(self.family, self.snapshot.name(i), self.snapshot.key(i), self.snapshot.prices[i])
+
+    def find(self, key):
+        i = self.snapshot.find(key)
+        return self._entry(i) if i is not None else None
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = self.snapshot.names()
+        return self._names
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            entries = (self._entry(i) for i in range(self.snapshot.count))
+            self._entries = {entry.key: entry for entry in entries}
+        return self._entries
+
+    @property
+    def errors(self):
+        return self.snapshot.errors()
+
+
+def normalize_name(name):
+    """'Baguette Carre 1 10*9 ' and 'Baguette  Carre 1 10*9' both give 'Baguette Carre 1 10*9'."""
+    return " ".join(name.split())
+
+
+def parse_price(text):
+    """Parses '12', ' 12 ' or '12,5' (comma decimals), raises ValueError otherwise."""
+    return float(text.strip().replace(",", "."))
+
+
+def build_catalog(family, rows):
+    """
+    Turns (name, price) rows into a Catalog with numeric prices.
+    Invalid rows are skipped and described in Catalog.errors.
+    """
+    entries = {}
+    errors = []
+    # line 1 is the header
+    for line_no, (name, raw_price) in enumerate(rows, start=2):
+        name = (name or "").strip()
+        raw_price = (raw_price or "").strip()
+        if not name:
+            if raw_price:
+                errors.append(f"line {line_no}: price {raw_price!r} without a name")
+            # empty ;;;;; lines are ignored
+            continue
+        try:
+            price = parse_price(raw_price)
+        except ValueError:
+            errors.append(f"line {line_no}: invalid price {raw_price!r} for {name!r}")
+            continue
+        key = normalize_name(name)
+        if key in entries:
+            errors.append(f"line {line_no}: duplicate {name!r}, the last price is used")
+        entries[key] = CatalogEntry(family, name, key, price)
+    return Catalog(family, entries, errors)
+
+
+class CatalogRegistry:
+    """
+    Loads each CSV catalog the first time it is used and keeps it in memory.
+    Nothing is parsed at import time, so startup does not grow with the catalogs.
+
+    Prices are parsed once at load time and looked up by (family, normalized name),
+    so pricing a line is a dictionary lookup without any string parsing.
+
+    With use_snapshots, a parsed CSV is also compiled into a binary snapshot that
+    later launches memory-map instead of parsing the CSV (see snapshot.py).
+
+    check_for_updates() re-parses a catalog whose CSV file was replaced and
+    swaps it in one assignment, readers see either the old or the new catalog.
+    """
+    def __init__(self, use_snapshots=True):
+        self.use_snapshots = use_snapshots
+        # name -> Catalog, replaced as a whole on reload
+        self._catalogs = {}
+        self._fingerprints = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.load_times = {}
+        # Incremented every time a loaded catalog is replaced
+        self.version = 0
+
+    def families(self):
+        return list(MODEL_FILES.keys())
+
+    def is_loaded(self, name):
+        return name in self._catalogs
+
+    def _reader(self, name):
+        if name == COLORS:
+            couleur = Couleur(COLOR_FILE)
+            return couleur.file_path, couleur.extract_rows
+        model = Model(MODEL_FILES[name])
+        return model.file_path, model.extract_rows
+
+    def source_path(self, name):
+        """Absolute path of the CSV file of a catalog."""
+        return self._reader(name)[0]
+
+    def _load_snapshot(self, name, file_path, stat):
+        """
+        Opens the snapshot of a CSV file if it is still up to date.
+
+        :return: Tuple (SnapshotCatalog, sha1 of the CSV), (None, None) when it must be rebuilt
+        """
+        snapshot = open_snapshot(snapshot_path(file_path))
+        if snapshot is None:
+            return None, None
+        if (snapshot.source_mtime_ns, snapshot.source_size) != (stat.st_mtime_ns, stat.st_size):
+            # Copied or touched files get a new mtime, only the content decides
+            with open(file_path, mode='rb') as file:
+                digest = hashlib.sha1(file.read()).hexdigest()
+            if digest != snapshot.source_sha1:
+                snapshot.close()
+                return None, None
+        return SnapshotCatalog(name, snapshot), snapshot.source_sha1
+
+    def _load(self, name):
+        """Loads a catalog and stores it together with the fingerprint of its file."""
+        start = time.perf_counter()
+        file_path, extract = self._reader(name)
+        stat = os.stat(file_path)
+        loaded = digest = None
+        source = "snapshot"
+        if self.use_snapshots:
+            loaded, digest = self._load_snapshot(name, file_path, stat)
+        if loaded is None:
+            source = "CSV"
+            with open(file_path, mode='rb') as file:
+                raw = file.read()
+            loaded = build_catalog(name, extract(raw.decode('utf-8')))
+            digest = hashlib.sha1(raw).hexdigest()
+            if self.use_snapshots:
+                try:
+                    write_snapshot(snapshot_path(file_path), loaded.entries.values(), loaded.errors,
+                                   stat.st_size, stat.st_mtime_ns, digest)
+                except OSError as e:
+                    # Read-only folder, or the old snapshot is still mapped (Windows)
+                    logger.debug("Snapshot of %s not written: %s", name, e)
+        elapsed = time.perf_counter() - start
+
+        self._fingerprints[name] = (stat.st_mtime_ns, stat.st_size, digest)
+        self._catalogs[name] = loaded
+        self.load_times[name] = elapsed
+        logger.info("Loaded catalog %s (%d references) from %s in %.1f ms", name, len(loaded), source, elapsed * 1000)
+        # Bad rows are reported once here instead of failing while pricing a quote
+        for error in loaded.errors:
+            logger.warning("Catalog %s, %s %s", name, os.path.basename(file_path), error)
+        return loaded
+
+    def get(self, name):
+        """
+        Returns the Catalog, loading it on first use.
+
+        :param name: A product family from MODEL_FILES or COLORS
+        """
+        loaded = self._catalogs.get(name)
+        if loaded is not None:
+            return loaded
+        if name != COLORS and name not in MODEL_FILES:
+            raise KeyError(f"Unknown catalog: {name}")
+        with self._lock:
+            # Another thread may have loaded it while we were waiting
+            if name not in self._catalogs:
+                self._load(name)
+            return self._catalogs[name]
+
+    def keys(self, name):
+        """Display names in file order."""
+        return self.get(name).names
+
+    def lookup(self, family, name):
+        """Returns the CatalogEntry of a variant or colour, None when unknown."""
+        if family != COLORS and family not in MODEL_FILES:
+            return None
+        return self.get(family).find(normalize_name(name))
+
+    def price(self, family, name, default=None):
+        entry = self.lookup(family, name)
+        return entry.price if entry is not None else default
+
+    def variants(self, family):
+        """Variant names of a product family, empty for an unknown family."""
+        if family not in MODEL_FILES:
+            return []
+        return self.keys(family)
+
+    def colors(self):
+        return self.keys(COLORS)
+
+    def search(self, name, query, limit=50):
+        """Names of a catalog matching a type-ahead query, best first, see search.py."""
+        if name != COLORS and name not in MODEL_FILES:
+            return []
+        return self.get(name).search_index.search(query, limit)
+
+    def load_all(self):
+        """Loads every catalog, e.g. to warm up a worker process."""
+        for name in self.families() + [COLORS]:
+            self.get(name)
+
+    def add_listener(self, callback):
+        """callback(changed_names) is called after catalogs were reloaded."""
+        self._listeners.append(callback)
+
+    def _has_changed(self, name):
+        file_path = self._reader(name)[0]
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # File is being replaced, try again on the next check
+            return False
+        mtime_ns, size, digest = self._fingerprints[name]
+        if (stat.st_mtime_ns, stat.st_size) == (mtime_ns, size):
+            return False
+        with open(file_path, mode='rb') as file:
+            if hashlib.sha1(file.read()).hexdigest() != digest:
+                return True
+        # Touched but identical, remember the new mtime so it is not hashed again
+        self._fingerprints[name] = (stat.st_mtime_ns, stat.st_size, digest)
+        return False
+
+    def check_for_updates(self):
+        """
+        Re-parses the loaded catalogs whose CSV file changed since it was read.
+        Unchanged files only cost a stat() call.
+
+        :return: List of reloaded catalog names
+        """
+        changed = []
+        with self._lock:
+            for name in list(self._catalogs.keys()):
+                if not self._has_changed(name):
+                    continue
+                try:
+                    self._load(name)
+                except Exception as e:
+                    # Keep serving the previous catalog if the new file is unreadable
+                    logger.error("Reloading catalog %s failed: %s", name, e)
+                    continue
+                changed.append(name)
+            if changed:
+                self.version += 1
+        if changed:
+            for callback in self._listeners:
+                callback(changed)
+        return changed
+
+
+class CatalogWatcher(threading.Thread):
+    """Background thread polling the registry for replaced CSV files."""
+    def __init__(self, registry, interval=2.0):
+        super().__init__(daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.registry.check_for_updates()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+# Process-wide registry
+catalog = CatalogRegistry()
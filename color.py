@@ -1,42 +1,49 @@
 import csv
-import os
-import sys
+import io
+from resources import resource_path
 
 class Couleur:
     def __init__(self, relative_path: str):
-        # If running as a PyInstaller bundle, use the temporary _MEIPASS path
-        if getattr(sys, 'frozen', False):
-            base_path = sys._MEIPASS  # PyInstaller extracts to this temp dir
-        else:
-            base_path = os.path.dirname(__file__)
-
-        self.file_path = os.path.join(base_path, relative_path)
+        # Resolves to the PyInstaller _MEIPASS folder when running as a bundle
+        self.file_path = resource_path(relative_path)
         self.col_color = 'Nom Couleur'
         self.col_price = 'Prix'
     
-    def extract_color_prix(self):
+    def extract_rows(self, content=None):
+        """
+        Reads a semicolon-delimited CSV file and returns the 'Nom Couleur'
+        and 'Prix' columns of every row, as written in the file.
+
+        :param content: Already read CSV text, the file is read when omitted
+        :return: List of tuples (col_color, col_price), missing cells are None
+        """
+        if content is None:
+            with open(self.file_path, mode='r', newline='', encoding='utf-8') as file:
+                content = file.read()
+        reader = csv.DictReader(io.StringIO(content, newline=''), delimiter=';')
+        return [(row.get(self.col_color), row.get(self.col_price)) for row in reader]
+
+    def extract_color_prix(self, content=None):
         """
         Reads a semicolon-delimited CSV file and returns a dictionary
         with 'Nom Couleur' as keys and 'Prix' as values.
 
-        :param file_path: Path to the CSV file
+        :param content: Already read CSV text, the file is read when omitted
         :return: Dictionary {col_color: col_price}
         """
         result = {}
-        with open(self.file_path, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file, delimiter=';')
-            for row in reader:
-                nom_color = row.get(self.col_color)
-                prix = row.get(self.col_price)
-                if nom_color is not None and prix is not None:
-                    result[nom_color] = prix
+        for name, prix in self.extract_rows(content):
+            if name is not None and prix is not None:
+                result[name] = prix
         return result
-    
-# Extract CSV_Couleur
-csv_couleur_filepath = "CSV/CSV_Couleur.csv"
-# Create instance of Couleur
-csv_couleur = Couleur(csv_couleur_filepath)
-# Extract csv file and store in a dict
-csv_couleur_dict = csv_couleur.extract_color_prix()
-# Get keys and store them in a list
-csv_couleur_keys_list = list(csv_couleur_dict.keys())
\ No newline at end of file
+
+
+# The catalog is no longer parsed at import time, see catalog.py.
+# The former module-level names are still available and load on first access.
+def __getattr__(name):
+    if name in ("csv_couleur_dict", "csv_couleur_keys_list"):
+        from catalog import catalog, COLORS
+        if name == "csv_couleur_dict":
+            return {entry.name: entry.price for entry in catalog.get(COLORS).entries.values()}
+        return catalog.keys(COLORS)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
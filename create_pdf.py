@@ -1,19 +1,165 @@
+import reportlab
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.lib import colors
-from reportlab.pdfgen import canvas
 from datetime import datetime
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from PIL import Image as PILImage
+from resources import resource_path
+from drawing import StateCanvas, TextBatch, STYLES, wrap_text
+from metrics import metrics
+import hashlib
 import io
+import json
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Renders slower than this log their stage breakdown as a warning
+SLOW_RENDER_SECONDS = 2.0
+
+# Font name -> TTF file, relative to the resource root
+FONT_FILES = {
+    "Georgia": "fonts/georgia.ttf",
+    "Georgia-Bold": "fonts/georgiab.ttf",
+    "Charter": "fonts/Charter Regular.ttf",
+    "Charter-Bold": "fonts/Charter Bold.ttf",
+    "Times-Roman-Bold": "fonts/timesbd.ttf",
+    "Rounhand-Bold": "fonts/Roundhand Bold.ttf",
+}
+
+# Icons drawn on every quote, relative to the resource root
+ICON_FILES = ["phone1.png", "email1.png", "phone.png", "email.png"]
+
+# Bump when a layout change must invalidate the PDFs kept by pdf_cache.py
+RENDERER_VERSION = 4
+
+# Items table cells: space kept before the next column, most lines of a variant and of a colour
+CELL_PADDING = 2 * mm
+MAX_VARIANT_LINES = 3
+MAX_COLOR_LINES = 2
+# Colour names start after their bullet
+BULLET_INDENT = 4 * mm
+
+_font_lock = threading.Lock()
+_font_load_times = {}
+
+_image_lock = threading.Lock()
+_image_cache = {}
+
+
+def register_fonts():
+    """
+    Registers the custom fonts once per process.
+    Fonts already known to reportlab are skipped, so repeated calls are free.
+
+    :return: Dictionary {font_name: load time in seconds}
+    """
+    with _font_lock:
+        registered = set(pdfmetrics.getRegisteredFontNames())
+        start = time.perf_counter()
+        for font_name, relative_path in FONT_FILES.items():
+            if font_name in registered:
+                continue
+            font_start = time.perf_counter()
+            try:
+                pdfmetrics.registerFont(TTFont(font_name, resource_path(relative_path)))
+            except Exception as e:
+                logger.error("Font registration failed for %s: %s", font_name, e)
+                continue
+            _font_load_times[font_name] = time.perf_counter() - font_start
+        elapsed = time.perf_counter() - start
+        if len(registered) != len(pdfmetrics.getRegisteredFontNames()):
+            logger.info("Fonts registered in %.3fs", elapsed)
+        return dict(_font_load_times)
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def renderer_fingerprint(data=None):
+    """
+    Everything besides invoice_data that decides the bytes of a PDF: renderer
+    and reportlab versions, fonts, icons and the logo of data.
+
+    :return: JSON-serializable dictionary
+    """
+    files = [resource_path(relative_path) for relative_path in list(FONT_FILES.values()) + ICON_FILES]
+    logo_path = (data or {}).get('header', {}).get('logoPath')
+    if logo_path:
+        files.append(os.path.abspath(logo_path))
+    return {
+        "renderer": RENDERER_VERSION,
+        "reportlab": reportlab.Version,
+        "files": {path: _file_version(path) for path in files}
+    }
+
+
+def load_flattened_image(png_path, hex_bg="#FFFFFF"):
+    """
+    Returns the image flattened onto a solid background, processed once per
+    (path, mtime, background colour) and kept for the lifetime of the process.
+
+    :return: Tuple (digest of the file content and background, ImageReader)
+    """
+    path = os.path.abspath(png_path)
+    key = (path, os.path.getmtime(path), hex_bg.upper())
+    with _image_lock:
+        cached = _image_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    # Named after the content, not the path, so the PDF does not depend on where the app is installed
+    digest = hashlib.md5(raw + key[2].encode('ascii')).hexdigest()
+    img = PILImage.open(io.BytesIO(raw))
+    if img.mode in ('RGBA', 'LA'):
+        hex_color = hex_bg.lstrip('#')
+        bg_color = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        background = PILImage.new('RGB', img.size, bg_color)
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    else:
+        img.load()
+    reader = ImageReader(img)
+    reader.getRGBData()  # decode now so every document reuses the pixel data
+
+    with _image_lock:
+        # Drop entries of an older version of the same file
+        for old_key in [k for k in _image_cache if k[0] == path and k[2] == key[2]]:
+            del _image_cache[old_key]
+        _image_cache[key] = (digest, reader)
+    return digest, reader
+
+def _pdf_date_formatter(invoice_date):
+    """Date formatter giving every date of the document the invoice date (dd/mm/YYYY), midnight UTC."""
+    try:
+        day = datetime.strptime(invoice_date, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        return None
+    return lambda *timestamp: day.strftime("D:%Y%m%d000000+00'00'")
+
 
 class PDFGenerator:
-    def __init__(self, file_path):
+    def __init__(self, file_path=None, deterministic=False):
+        """
+        :param deterministic: Pin the document dates and ID so the same data always gives the same bytes
+        """
         self.file_path = file_path
+        self.deterministic = deterministic
         self.c = None
+        self.data = None
         self.page_width, self.page_height = A4
         self.left_margin = 20 * mm
         self.right_margin = 20 * mm
@@ -22,24 +168,22 @@ class PDFGenerator:
         self.content_width = self.page_width - self.left_margin - self.right_margin
         self.current_y = self.page_height - self.top_margin
         self.DEFAULT_LINE_HEIGHT_MM = 12
+        self.TOTALS_BLOCK_HEIGHT = 286
         self._register_fonts()
 
     def _register_fonts(self):
-        """Register custom fonts used in the PDF."""
-        try:
-            pdfmetrics.registerFont(TTFont("Georgia", "fonts/georgia.TTF"))
-            pdfmetrics.registerFont(TTFont("Georgia-Bold", "fonts/georgiab.TTF"))
-            pdfmetrics.registerFont(TTFont("Charter", "fonts/Charter Regular.ttf"))
-            pdfmetrics.registerFont(TTFont("Charter-Bold", "fonts/Charter Bold.ttf"))
-            pdfmetrics.registerFont(TTFont("Times-Roman-Bold", "fonts/timesbd.ttf"))
-            pdfmetrics.registerFont(TTFont("Rounhand-Bold", "fonts/Roundhand Bold.ttf"))
-        except Exception as e:
-            print(f"Font registration failed: {e}")
-
-    def _draw_text(self, text, x, y, font_name='Helvetica', font_size=10, color=colors.black, alignment='left'):
-        """Draw text on the canvas with given properties."""
-        self.c.setFont(font_name, font_size)
-        self.c.setFillColor(color)
+        """Register custom fonts used in the PDF (loaded once per process)."""
+        register_fonts()
+
+    def _draw_text(self, text, x, y, style, alignment='left'):
+        """
+        Draw text on the canvas.
+
+        :param style: Name of a text style of drawing.STYLES
+        """
+        style = STYLES[style]
+        self.c.setFont(style.font_name, style.font_size)
+        self.c.setFillColor(style.color)
         draw_method = {
             'left': self.c.drawString,
             'right': self.c.drawRightString,
@@ -54,23 +198,73 @@ class PDFGenerator:
 
     def remove_transparency_with_hex(self, png_path, hex_bg="#FFFFFF"):
         """Remove transparency from PNG and replace with solid background."""
-        img = PILImage.open(png_path)
-        if img.mode in ('RGBA', 'LA'):
-            bg_color = self.hex_to_rgb(hex_bg)
-            background = PILImage.new('RGB', img.size, bg_color)
-            background.paste(img, mask=img.split()[-1])
-            byte_io = io.BytesIO()
-            background.save(byte_io, format='PNG')
-            byte_io.seek(0)
-            return ImageReader(byte_io)
-        return ImageReader(png_path)
+        return load_flattened_image(png_path, hex_bg)[1]
+
+    def _draw_image(self, png_path, x, y, width, height, hex_bg="#FFFFFF"):
+        """
+        Draws a flattened PNG. The image is embedded once per document as a form
+        wrapping a unit-size image, later uses only reference that form.
 
+        :return: False when the file could not be read, nothing is drawn then
+        """
+        try:
+            digest, image_data = load_flattened_image(png_path, hex_bg)
+        except OSError as e:
+            logger.warning("Image not drawn: %s", e)
+            return False
+        form_name = "Img" + digest[:12]
+        if not self.c.hasForm(form_name):
+            self.c.beginForm(form_name, 0, 0, 1, 1)
+            self.c.drawImage(image_data, 0, 0, width=1, height=1)
+            self.c.endForm()
+        self.c.saveState()
+        self.c.translate(x, y)
+        self.c.scale(width, height)
+        self.c.doForm(form_name)
+        self.c.restoreState()
+        return True
+
+
+    def _static_form_name(self, kind, data):
+        """Form name derived from the settings snapshot the static layer is drawn from."""
+        snapshot = json.dumps(data, sort_keys=True, default=str)
+        return f"Static{kind}" + hashlib.md5(snapshot.encode('utf-8')).hexdigest()[:12]
+
+    def _draw_static_form(self, name, draw_layer, lowery=0, uppery=None):
+        """
+        Records draw_layer() once per document as a form XObject and places it on the
+        current page. Later pages only reference the form instead of drawing it again.
+        """
+        if not self.c.hasForm(name):
+            self.c.beginForm(name, 0, lowery, self.page_width, uppery)
+            draw_layer()
+            self.c.endForm()
+        self.c.doForm(name)
+
+    def _header_bottom_y(self):
+        header_height_percentage = 0.19
+        return self.page_height - (self.page_height * header_height_percentage)
 
     def _draw_header(self, data):
+        """
+        Draws the company header (background, logo, contact info) shared by every page.
+        It only depends on the settings, so it is drawn once per document as a form.
+        """
+        header = data['header']
+        logo_path = header.get('logoPath')
+        # A logo added or removed later must give another form, its path is left out
+        # so the form name does not depend on where the app is installed
+        snapshot = {key: value for key, value in header.items() if key != 'logoPath'}
+        snapshot['logoExists'] = bool(logo_path and os.path.exists(logo_path))
+        self._draw_static_form(self._static_form_name("Header", snapshot), lambda: self._draw_header_layer(data))
+
+        # Move Y position down after header
+        self.current_y = self._header_bottom_y() - (10 * mm)
+
+    def _draw_header_layer(self, data):
         """Draws the header section of the PDF, including background, logo, and contact info."""
-        header_height_percentage = 0.19
-        header_background_height = self.page_height * header_height_percentage
         header_top_y = self.page_height
+        header_background_height = header_top_y - self._header_bottom_y()
 
         # Draw header background
         self.c.setFillColor(colors.HexColor('#313B4B'))
@@ -85,17 +279,14 @@ class PDFGenerator:
         logo_x = self.left_margin + (20 * mm)
         logo_y = content_header_start_y - logo_height
 
+        logo_drawn = False
         if logo_path and os.path.exists(logo_path):
             try:
-                image_data = self.remove_transparency_with_hex(logo_path, hex_bg="#313B4B") 
-                self.c.drawImage(image_data, logo_x, logo_y, width=logo_width, height=logo_height)
+                logo_drawn = self._draw_image(logo_path, logo_x, logo_y, logo_width, logo_height, hex_bg="#313B4B")
             except Exception as e:
-                print(f"Error drawing logo image: {e}")
-                self._draw_text("[LOGO]", logo_x, logo_y + (logo_height / 2) - (8 * mm),
-                                font_name='Helvetica-Bold', font_size=20, color=colors.white)
-        else:
-            self._draw_text("[LOGO]", logo_x, logo_y + (logo_height / 2) - (8 * mm),
-                            font_name='Helvetica-Bold', font_size=20, color=colors.white)
+                logger.warning("Error drawing logo image: %s", e)
+        if not logo_drawn:
+            self._draw_text("[LOGO]", logo_x, logo_y + (logo_height / 2) - (8 * mm), style='logo_placeholder')
 
         # Draw vertical divider between logo and contact
         self.c.setFillColor(colors.HexColor('#D5D5D5'))
@@ -115,82 +306,65 @@ class PDFGenerator:
             data['header']['contactInfo']['email']
         ]
 
-        font_charter_bold = "Charter-Bold"
         for i, line in enumerate(contact_lines):
             contact_info_x = self.page_width - self.right_margin - (64 * mm)
             if i == 3:
                 line = "      " + line
-                phone_icon_path = "phone1.png"
-                phone_data = self.remove_transparency_with_hex(phone_icon_path, hex_bg="#313B4B") 
-                self.c.drawImage(phone_data, contact_info_x, contact_info_y_start - (i * line_height) - (0.5 * mm), width=3.5 * mm, height=3.5 * mm)
+                phone_icon_path = resource_path("phone1.png")
+                self._draw_image(phone_icon_path, contact_info_x, contact_info_y_start - (i * line_height) - (0.5 * mm), 3.5 * mm, 3.5 * mm, hex_bg="#313B4B")
             if i == 4:
                 line = "      " + line
-                email_icon_path = "email1.png"
-                email_data = self.remove_transparency_with_hex(email_icon_path, hex_bg="#313B4B") 
-                self.c.drawImage(email_data, contact_info_x, contact_info_y_start - (i * line_height) - (0.5 * mm), width=3.5 * mm, height=3.5 * mm)
+                email_icon_path = resource_path("email1.png")
+                self._draw_image(email_icon_path, contact_info_x, contact_info_y_start - (i * line_height) - (0.5 * mm), 3.5 * mm, 3.5 * mm, hex_bg="#313B4B")
 
-            self._draw_text(line, contact_info_x, contact_info_y_start - (i * line_height),
-                            font_name=font_charter_bold, font_size=11, color=colors.HexColor('#D5D5D5'))
+            self._draw_text(line, contact_info_x, contact_info_y_start - (i * line_height), style='company_contact')
 
         # Additional company registration info
         self._draw_text(f"RC    {data['header']['contactInfo']['rc']}", contact_info_x, contact_info_y_start - (5 * line_height),
-                        font_name=font_charter_bold, font_size=8, color=colors.HexColor('#D5D5D5'))
+                        style='company_legal')
         self._draw_text(f"Nis  {data['header']['contactInfo']['nis']}", contact_info_x + (37 * mm), contact_info_y_start - (5 * line_height),
-                        font_name=font_charter_bold, font_size=8, color=colors.HexColor('#D5D5D5'))
+                        style='company_legal')
         self._draw_text(f"Nif    {data['header']['contactInfo']['nif']}", contact_info_x, contact_info_y_start - (6 * line_height) + (1 * mm),
-                        font_name=font_charter_bold, font_size=8, color=colors.HexColor('#D5D5D5'))
+                        style='company_legal')
         self._draw_text(f"Art  {data['header']['contactInfo']['article']}", contact_info_x + (37 * mm), contact_info_y_start - (6 * line_height) + (1 * mm),
-                        font_name=font_charter_bold, font_size=8, color=colors.HexColor('#D5D5D5'))
-
-        # Move Y position down after header
-        self.current_y = header_top_y - header_background_height - (10 * mm)
+                        style='company_legal')
 
     def _draw_bill_to_and_invoice_details(self, data):
         """Draws the billing information and invoice title/details section."""
-        font_charter = "Charter"
-        font_charter_bold = "Charter-Bold"
 
         # --- Bill To Section (left column) ---
         bill_to_x = self.left_margin
         current_y_bill_to = self.current_y - (15 * mm)
 
-        self._draw_text("DESTINATAIRE:", bill_to_x, current_y_bill_to,
-                        font_name=font_charter, font_size=12, color=colors.HexColor('#C9B7A1'))
-        self._draw_text(data['billTo']['name'], bill_to_x + (33 * mm), current_y_bill_to,
-                        font_name=font_charter_bold, font_size=12, color=colors.HexColor('#666666'))
+        self._draw_text("DESTINATAIRE:", bill_to_x, current_y_bill_to, style='bill_to_label')
+        self._draw_text(data['billTo']['name'], bill_to_x + (33 * mm), current_y_bill_to, style='bill_to_name')
         current_y_bill_to -= (4.5 * mm)
 
-        self._draw_text(data['billTo']['addressLine1'], bill_to_x, current_y_bill_to,
-                        font_name=font_charter, font_size=10, color=colors.HexColor('#666666'))
+        self._draw_text(data['billTo']['addressLine1'], bill_to_x, current_y_bill_to, style='body')
         current_y_bill_to -= self.DEFAULT_LINE_HEIGHT_MM + (0.5 * mm)
 
-        self._draw_text(data['billTo']['addressLine2'], bill_to_x, current_y_bill_to,
-                        font_name=font_charter, font_size=10, color=colors.HexColor('#666666'))
+        self._draw_text(data['billTo']['addressLine2'], bill_to_x, current_y_bill_to, style='body')
         current_y_bill_to -= self.DEFAULT_LINE_HEIGHT_MM +  (0.5 * mm)
 
-        phone_icon_path = "phone.png"
-        phone_data = self.remove_transparency_with_hex(phone_icon_path, hex_bg="#FFFFFF")
-        self.c.drawImage(phone_data, bill_to_x, current_y_bill_to - (0.5 * mm), width=3.5 * mm, height=3.5 * mm)
-        self._draw_text("      " + data['billTo']['phone'], bill_to_x, current_y_bill_to,
-                        font_name=font_charter, font_size=10, color=colors.HexColor('#666666'))
+        phone_icon_path = resource_path("phone.png")
+        self._draw_image(phone_icon_path, bill_to_x, current_y_bill_to - (0.5 * mm), 3.5 * mm, 3.5 * mm, hex_bg="#FFFFFF")
+        self._draw_text("      " + data['billTo']['phone'], bill_to_x, current_y_bill_to, style='body')
         current_y_bill_to -= self.DEFAULT_LINE_HEIGHT_MM - (0.2 * mm)
 
-        email_icon_path = "email.png"
-        email_data = self.remove_transparency_with_hex(email_icon_path, hex_bg="#FFFFFF")
-        self.c.drawImage(email_data, bill_to_x, current_y_bill_to - (0.5 * mm), width=3.5 * mm, height=3.5 * mm)
-        self._draw_text("      " + data['billTo']['email'], bill_to_x, current_y_bill_to,
-                        font_name=font_charter, font_size=10, color=colors.HexColor('#666666'))
+        email_icon_path = resource_path("email.png")
+        self._draw_image(email_icon_path, bill_to_x, current_y_bill_to - (0.5 * mm), 3.5 * mm, 3.5 * mm, hex_bg="#FFFFFF")
+        self._draw_text("      " + data['billTo']['email'], bill_to_x, current_y_bill_to, style='body')
         current_y_bill_to -= self.DEFAULT_LINE_HEIGHT_MM - (0.2 * mm)
 
         # Legal identifiers
         self._draw_text(f"RC    {data['header']['contactInfo']['rc']}", bill_to_x, current_y_bill_to,
-                        font_name=font_charter, font_size=7, color=colors.HexColor('#5E5E5E'))
+                        style='bill_to_legal')
         self._draw_text(f"Nis       {data['header']['contactInfo']['nis']}", bill_to_x + (32 * mm), current_y_bill_to,
-                        font_name=font_charter, font_size=7, color=colors.HexColor('#5E5E5E'))
+                        style='bill_to_legal')
         self._draw_text(f"Nif    {data['header']['contactInfo']['nif']}", bill_to_x, current_y_bill_to - (3 * mm),
-                        font_name=font_charter, font_size=7, color=colors.HexColor('#5E5E5E'))
+                        style='bill_to_legal')
         self._draw_text(f"Article  {data['header']['contactInfo']['article']}", bill_to_x + (32 * mm), current_y_bill_to - (3 * mm),
-                        font_name=font_charter, font_size=7, color=colors.HexColor('#5E5E5E'))
+                        style='bill_to_legal')
 
         # REMOVE
         #self.c.setFillColor(colors.HexColor("#FF5151"))
@@ -203,8 +377,7 @@ class PDFGenerator:
 
         #P R O F O R M A
         inv_title = " ".join(data['invoiceDetails']['invoiceTitle'].upper())
-        self._draw_text(inv_title, invoice_title_x, invoice_title_y,
-                        font_name='Times-Roman', font_size=18, color=colors.HexColor('#313B4B'))
+        self._draw_text(inv_title, invoice_title_x, invoice_title_y, style='invoice_title')
         self.current_y -= (10 * mm)
 
         self.c.setFillColor(colors.HexColor('#313B4B'))
@@ -221,13 +394,9 @@ class PDFGenerator:
         invoice_x_pos = invoice_title_x
         invoice_y_pos = invoice_title_y - (13.5 * mm)
 
-        font_times = "Times-Roman"
-        font_times_bold = "Times-Roman-Bold"
         for label, value in invoice_date_lines:
-            self._draw_text(label, invoice_x_pos, current_y_invoice_details,
-                            font_name=font_times, font_size=8, color=colors.HexColor('#666666'))
-            self._draw_text(value, invoice_x_pos, invoice_y_pos,
-                            font_name=font_times_bold, font_size=8, color=colors.HexColor('#666666'))
+            self._draw_text(label, invoice_x_pos, current_y_invoice_details, style='invoice_detail_label')
+            self._draw_text(value, invoice_x_pos, invoice_y_pos, style='invoice_detail_value')
             invoice_x_pos += 30 * mm if label == "Date d’édition:" else 25 * mm
 
         # Vertical dividers
@@ -245,13 +414,29 @@ class PDFGenerator:
             return True
         return False  
 
-    def _draw_items_table(self, items_data, decimal_point = ",", regex = False):
-        """Draws the items table with product details and totals."""
-        headers = ["NOM MODELE", "COULEURS", "PRIX UNITAIRE", "QUANTINTE", "TOTAL HT"]
-        col_widths = [35 * mm, 40 * mm, 30 * mm, 30 * mm, 33 * mm]
-        min_row_height = 8 * mm
-        header_height = 8 * mm
-
+    def _row_layout(self, item, style, col_widths, min_row_height=8 * mm):
+        """
+        Wraps the variant and the colours of an items table row to their columns.
+
+        :return: Tuple (variant lines, list of (first line number, colour lines), row height)
+        """
+        variant_lines = wrap_text(str(item['variant']), style.font_name, style.font_size,
+                                  col_widths[0] - CELL_PADDING, MAX_VARIANT_LINES)
+        color_width = col_widths[1] - BULLET_INDENT - CELL_PADDING
+        color_blocks = []
+        line_count = 0
+        for color in item['colors']:
+            lines = wrap_text(color.strip(), style.font_name, style.font_size, color_width, MAX_COLOR_LINES)
+            color_blocks.append((line_count, lines))
+            line_count += len(lines)
+        # A one-line variant fits the minimum height of a row without colours
+        if len(variant_lines) > 1:
+            line_count = max(line_count, len(variant_lines))
+        row_height = max(min_row_height, line_count * self.DEFAULT_LINE_HEIGHT_MM + (7 * mm))
+        return variant_lines, color_blocks, row_height
+
+    def _draw_items_header(self, headers, col_widths, header_height):
+        """Draws the column headers of the items table at the current Y position."""
         table_start_y = self.current_y
         table_start_x = self.left_margin
 
@@ -260,112 +445,124 @@ class PDFGenerator:
         self.c.setStrokeColor(colors.HexColor('#5E5E5E'))
         self.c.rect(table_start_x, table_start_y, self.page_width - (40 * mm), 0.3 * mm, fill=1)
         self.c.rect(table_start_x, table_start_y - header_height, self.page_width- (40 * mm), 0.3 * mm, fill=1)
-        color = "#333333"
-        if regex:
-            if self.process_regex():
-                color = "#FFFFFF"
-        # Draw header text
 
+        # Draw header text, in one text object
         current_x_header = self.left_margin
-        self._draw_text(headers[0], current_x_header, table_start_y - (header_height / 2) - (1 * mm),
-                            font_name='Georgia-Bold', font_size=10, color=colors.HexColor('#5E5E5E'), alignment="left")
-        self._draw_text(headers[1], current_x_header + col_widths[0], table_start_y - (header_height / 2) - (1 * mm),
-                            font_name='Georgia-Bold', font_size=10, color=colors.HexColor('#5E5E5E'), alignment="left")
-        self._draw_text(headers[2], current_x_header + col_widths[0] + col_widths[1] + col_widths[2], table_start_y - (header_height / 2) - (1 * mm),
-                            font_name='Georgia-Bold', font_size=10, color=colors.HexColor('#5E5E5E'), alignment="right")
-        self._draw_text(headers[3], current_x_header + col_widths[0] + col_widths[1] + col_widths[2] + col_widths[3], table_start_y - (header_height / 2) - (1 * mm),
-                            font_name='Georgia-Bold', font_size=10, color=colors.HexColor('#5E5E5E'), alignment="right")
-        self._draw_text(headers[4], current_x_header + col_widths[0] + col_widths[1] + col_widths[2] + col_widths[3]  + col_widths[4], table_start_y - (header_height / 2) - (1 * mm),
-                            font_name='Georgia-Bold', font_size=10, color=colors.HexColor('#5E5E5E'), alignment="right")
-        
-        #for i, header in enumerate(headers):
-        #    alignment = "left"
-        #    if i == 3 or i == 4 or i ==5:
-        #        alignment = "right"
-            
-        #    self._draw_text(header, current_x_header, table_start_y - (header_height / 2) - (1 * mm),
-        #                    font_name='Georgia-Bold', font_size=10, color=colors.HexColor('#5E5E5E'), alignment=alignment)
-        #    current_x_header += col_widths[i]
+        header_y = table_start_y - (header_height / 2) - (1 * mm)
+        style = STYLES['table_header']
+        batch = TextBatch(self.c)
+        batch.draw(headers[0], current_x_header, header_y, style)
+        batch.draw(headers[1], current_x_header + col_widths[0], header_y, style)
+        batch.draw(headers[2], current_x_header + sum(col_widths[:3]), header_y, style, alignment="right")
+        batch.draw(headers[3], current_x_header + sum(col_widths[:4]), header_y, style, alignment="right")
+        batch.draw(headers[4], current_x_header + sum(col_widths[:5]), header_y, style, alignment="right")
+        batch.flush()
 
         self.c.setLineWidth(0.5)
         self.current_y -= header_height
 
+    def _new_page(self):
+        """Starts a new page with the company header and moves the Y position below it."""
+        self.c.showPage()
+        self._draw_header(self.data)
+
+    def _draw_items_table(self, items_data, decimal_point = ",", regex = False):
+        """
+        Draws the items table with product details and totals.
+        Rows that do not fit go to a new page, where the column headers are repeated.
+        """
+        headers = ["NOM MODELE", "COULEURS", "PRIX UNITAIRE", "QUANTINTE", "TOTAL HT"]
+        col_widths = [35 * mm, 40 * mm, 30 * mm, 30 * mm, 33 * mm]
+        header_height = 8 * mm
+        # Room kept under the last row for its thicker end line
+        end_line_space = 2.5 * mm
+
+        table_start_x = self.left_margin
+        col_variant_x = table_start_x
+        col_colors_x = table_start_x + col_widths[0]
+        col_unit_price_x = table_start_x + sum(col_widths[:3])
+        col_qty_x = table_start_x + sum(col_widths[:4])
+        col_total_x = table_start_x + sum(col_widths)
+
+        style = STYLES['cell']
+        if regex:
+            if self.process_regex():
+                style = STYLES['cell_hidden']
+        line_color = colors.HexColor('#717070')
+        batch = TextBatch(self.c)
+
+        row_layouts = [self._row_layout(item, style, col_widths) for item in items_data]
+        last_row = len(items_data) - 1
+
+        self._draw_items_header(headers, col_widths, header_height)
+
         # Draw each item row
         for i, item in enumerate(items_data):
-            color_lines = item['colors']
-            actual_desc_height = len(color_lines) * self.DEFAULT_LINE_HEIGHT_MM
-            calculated_row_height = max(min_row_height, actual_desc_height + (7 * mm))
+            variant_lines, color_blocks, calculated_row_height = row_layouts[i]
+            needed_height = calculated_row_height + (end_line_space if i == last_row else 0)
+            if self.current_y - needed_height < self.bottom_margin:
+                self._new_page()
+                self._draw_items_header(headers, col_widths, header_height)
 
             # Row bottom line or thicker end line
-            if i != (len(items_data) - 1):
-                self.c.setFillColor(colors.HexColor('#717070'))
+            self.c.setFillColor(line_color)
+            if i != last_row:
                 self.c.rect(table_start_x, self.current_y - calculated_row_height, self.page_width - (40 * mm), 0.01 * mm, fill=1)
-                #self.c.line(table_start_x, self.current_y - calculated_row_height, self.page_width - (20 * mm), self.current_y - calculated_row_height)
             else:
-                self.c.setFillColor(colors.HexColor("#717070"))
                 self.c.rect(table_start_x, self.current_y - calculated_row_height - (2 * mm), self.page_width - (40 * mm), 0.5 * mm, fill=1)
 
             y_single_line_cells = self.current_y - (5.6 * mm)
-            font_charter = "Charter"
-
-            # Draw individual cell data
-           
-            self._draw_text(item['variant'], table_start_x, y_single_line_cells,
-                            font_name=font_charter, font_size=10, color=colors.HexColor(color))
-            self._draw_text(f"{float(item['unitPrice']):.2f}".replace('.', decimal_point), table_start_x + sum(col_widths[:3]), y_single_line_cells,
-                            font_name=font_charter, font_size=10, color=colors.HexColor(color), alignment='right')
-            self._draw_text(str(item['qty']), table_start_x + sum(col_widths[:4]), y_single_line_cells,
-                            font_name=font_charter, font_size=10, color=colors.HexColor(color), alignment='right')
-            self._draw_text(f"{float(item['total']):.2f}".replace('.', decimal_point), table_start_x + sum(col_widths), y_single_line_cells,
-                            font_name=font_charter, font_size=10, color=colors.HexColor(color), alignment='right')
-
-            # Draw color lines with bullets
-            desc_y_start = self.current_y - (5.6 * mm)
-            for j, line in enumerate(color_lines):
-                text_to_draw = line.strip()
-                line_x_pos = table_start_x + col_widths[0]
-                if text_to_draw:
-                    self._draw_text("\u2022", line_x_pos, desc_y_start - (j * self.DEFAULT_LINE_HEIGHT_MM),
-                                    font_name=font_charter, font_size=10, color=colors.HexColor(color))
-                    self._draw_text(text_to_draw, line_x_pos + (4 * mm), desc_y_start - (j * self.DEFAULT_LINE_HEIGHT_MM),
-                                    font_name=font_charter, font_size=10, color=colors.HexColor(color))
+
+            # Draw individual cell data, the whole row is one text object
+            for j, line in enumerate(variant_lines):
+                batch.draw(line, col_variant_x, y_single_line_cells - (j * self.DEFAULT_LINE_HEIGHT_MM), style)
+            batch.draw(f"{float(item['unitPrice']):.2f}".replace('.', decimal_point), col_unit_price_x, y_single_line_cells,
+                       style, alignment='right')
+            batch.draw(str(item['qty']), col_qty_x, y_single_line_cells, style, alignment='right')
+            batch.draw(f"{float(item['total']):.2f}".replace('.', decimal_point), col_total_x, y_single_line_cells,
+                       style, alignment='right')
+
+            # Draw color lines, a bullet before the first line of each color
+            desc_y_start = y_single_line_cells
+            for first_line, lines in color_blocks:
+                if not lines[0]:
+                    continue
+                batch.draw("\u2022", col_colors_x, desc_y_start - (first_line * self.DEFAULT_LINE_HEIGHT_MM), style)
+                for j, line in enumerate(lines, start=first_line):
+                    batch.draw(line, col_colors_x + BULLET_INDENT, desc_y_start - (j * self.DEFAULT_LINE_HEIGHT_MM), style)
+            batch.flush()
             self.current_y -= calculated_row_height
 
         # Space after table
         self.current_y -= (10 * mm)
 
-        print(f"Current Y : {self.current_y}")
+        logger.debug("Current Y : %s", self.current_y)
 
     def _draw_totals_and_payment_method(self, data):
         """Draws the totals summary and payment method section."""
 
         section_start_y = self.current_y - (22 * mm)
 
-        # max_allowable_current_y = 286 
-        # to avoid overlapping of text when there are many products,
-        # we create a second page for the totals
-        if self.current_y < 286:
+        # The totals, payment method, terms and signature need about 286 points below
+        # the table. They are kept together: when they do not fit, they all move
+        # to a new page instead of running off the bottom of the current one.
+        if self.current_y < self.TOTALS_BLOCK_HEIGHT:
             # Start new page
-            self.c.showPage()
-            section_start_y = self.page_height - self.top_margin - (25 *mm)
+            self._new_page()
+            section_start_y = self.current_y - (22 * mm)
         
         # --- Left Column: Payment Method ---
         payment_method_x = self.left_margin
         current_y_left = section_start_y - (15 * mm)
 
-        font_georgia_bold = "Georgia-Bold"
-        font_charter = "Charter"
-        font_charter_bold = "Charter-Bold"
-
-        self._draw_text("MOYEN DE PAIEMENT", payment_method_x, current_y_left,
-                        font_name=font_charter, font_size=10, color=colors.HexColor('#C9B7A1'))
+        self._draw_text("MOYEN DE PAIEMENT", payment_method_x, current_y_left, style='section_title')
         self.c.setFillColor(colors.HexColor('#333333'))
         self.c.setStrokeColor(colors.HexColor('#333333'))
         self.c.rect(payment_method_x, current_y_left - (3 * mm), 50 * mm, 0.2 * mm, fill=1)
 
         current_y_left -= (8 * mm)
         self._draw_text(data['paymentMethod']['paymentMethod1'], payment_method_x, current_y_left,
-                        font_name=font_charter_bold, font_size=11, color=colors.HexColor('#666666'))
+                        style='payment_method')
 
         # --- Right Column: Totals Summary ---
         total_label_x = self.page_width - (78 * mm)
@@ -374,10 +571,8 @@ class PDFGenerator:
 
         def draw_total_row(label, value):
             nonlocal current_y_right
-            self._draw_text(label, total_label_x, current_y_right,
-                            font_name=font_georgia_bold, font_size=10, color=colors.HexColor('#717070'))
-            self._draw_text(f"{value}", total_value_x, current_y_right,
-                            font_name=font_charter, font_size=10, color=colors.HexColor('#717070'), alignment='right')
+            self._draw_text(label, total_label_x, current_y_right, style='total_label')
+            self._draw_text(f"{value}", total_value_x, current_y_right, style='total_value', alignment='right')
             current_y_right -= (8 * mm)
 
         decimal_point = data['totals']['decimalPoint']
@@ -390,16 +585,15 @@ class PDFGenerator:
         
         currency_sign = f"{data['totals']['currencySign']}"
 
-        print(f"Currency sign is : {currency_sign}")
+        logger.debug("Currency sign is : %s", currency_sign)
         draw_total_row("Sous Total HT", f"{formatted_subtotal} {currency_sign}")
         draw_total_row("Delivery Cost", f"{formatted_delivery_cost} {currency_sign}")
         draw_total_row("TVA",  f"{formatted_tax} {currency_sign}")
         draw_total_row("Total TTC", f"{formatted_total_ttc} {currency_sign}")
 
-        self._draw_text("Acompte", total_label_x, current_y_right,
-                        font_name=font_georgia_bold, font_size=10, color=colors.HexColor('#717070'))
+        self._draw_text("Acompte", total_label_x, current_y_right, style='total_label')
         self._draw_text(f"{formatted_discount_amt} {currency_sign}", total_value_x, current_y_right,
-                        font_name=font_charter, font_size=10, color=colors.HexColor('#717070'), alignment='right')
+                        style='total_value', alignment='right')
         current_y_right -= (5 * mm)
 
         # --- Grand Total Highlight ---
@@ -411,10 +605,9 @@ class PDFGenerator:
         self.c.rect(rect_x_start, current_y_right - grand_total_rect_height, rect_width, grand_total_rect_height, fill=1)
 
         grand_total_text_y = current_y_right - (grand_total_rect_height / 2)
-        self._draw_text("A PAYER", rect_x_start + (2 * mm), grand_total_text_y,
-                        font_name=font_georgia_bold, font_size=10, color=colors.HexColor('#FFFFFF'))
+        self._draw_text("A PAYER", rect_x_start + (2 * mm), grand_total_text_y, style='grand_total_label')
         self._draw_text(f"{formatted_grand_total} {currency_sign}", total_value_x, grand_total_text_y,
-                        font_name=font_charter, font_size=10, color=colors.HexColor('#FFFFFF'), alignment='right')
+                        style='grand_total_value', alignment='right')
 
         # Update vertical pointer
         #self.current_y = min(current_y_left, current_y_right - grand_total_rect_height - 10 * mm)
@@ -422,6 +615,20 @@ class PDFGenerator:
         self._draw_footer(data, grand_total_text_y)
 
     def _draw_footer(self, data, grand_total_text_y):
+        """
+        Draws the closing section. The thank-you note and signature only depend on
+        the settings, they are drawn once as a form and placed below the totals.
+        """
+        snapshot = {"thankYouMessage": data['thankYouMessage'], "signature": data['signature']}
+        self.c.saveState()
+        self.c.translate(0, grand_total_text_y)
+        # The layer is drawn relative to the grand total line, it extends below it
+        self._draw_static_form(self._static_form_name("Footer", snapshot),
+                               lambda: self._draw_footer_layer(data, 0),
+                               lowery=-70 * mm, uppery=0)
+        self.c.restoreState()
+
+    def _draw_footer_layer(self, data, grand_total_text_y):
         """Draws the closing section with a thank-you note and signature."""
         #self.current_y -= (10 * mm)
         #self.current_y -= grand_total_text_y
@@ -429,41 +636,94 @@ class PDFGenerator:
         # --- Thank You Message ---
         footer_current_y = grand_total_text_y - (25 *mm)
         self._draw_text("M e r c i  P o u r  V o t r e  C o n f i a n c e", self.left_margin, footer_current_y,
-                        font_name='Charter-Bold', font_size=13, color=colors.HexColor('#C9B7A1'))
+                        style='thank_you')
 
         footer_current_y -= 8 * mm
         ty_conditions_x = self.left_margin
-        self._draw_text(data['thankYouMessage']['heading'], ty_conditions_x, footer_current_y,
-                        font_name='Charter-Bold', font_size=10, color=colors.HexColor('#666666'))
+        self._draw_text(data['thankYouMessage']['heading'], ty_conditions_x, footer_current_y, style='body_bold')
         footer_current_y -= self.DEFAULT_LINE_HEIGHT_MM
-        self._draw_text(data['thankYouMessage']['notesLine1'], ty_conditions_x, footer_current_y,
-                        font_name='Charter', font_size=10, color=colors.HexColor('#666666'))
+        self._draw_text(data['thankYouMessage']['notesLine1'], ty_conditions_x, footer_current_y, style='body')
         footer_current_y -= self.DEFAULT_LINE_HEIGHT_MM
-        self._draw_text(data['thankYouMessage']['notesLine2'], ty_conditions_x, footer_current_y,
-                        font_name='Charter', font_size=10, color=colors.HexColor('#666666'))
+        self._draw_text(data['thankYouMessage']['notesLine2'], ty_conditions_x, footer_current_y, style='body')
 
         # --- Signature ---
         signature_center_x = self.page_width - self.right_margin - (30 * mm)
 
         signature_y_start = grand_total_text_y - (25 *mm)
         self._draw_text(data['signature']['name'], signature_center_x, signature_y_start,
-                        font_name='Rounhand-Bold', font_size=14, color=colors.HexColor('#333333'), alignment='center')
+                        style='signature', alignment='center')
 
         self.c.setFillColor(colors.HexColor('#333333'))
         self.c.setStrokeColor(colors.HexColor('#333333'))
         self.c.rect(signature_center_x - (30 * mm), signature_y_start - (4 * mm), 60 * mm, 0.1 * mm, fill=1)
 
         self._draw_text(data['signature']['fullName'], signature_center_x , signature_y_start - (13 * mm),
-                        font_name='Times-Roman-Bold', font_size=12, color=colors.HexColor('#333333'), alignment='center')
+                        style='signature_name', alignment='center')
         self._draw_text(data['signature']['title'], signature_center_x, signature_y_start - (19 * mm),
-                        font_name='Times-Roman', font_size=12, color=colors.HexColor('#333333'), alignment='center')
-    def create_pdf(self, data):
-        """Main method to create the PDF document."""
-        self.c = canvas.Canvas(self.file_path, pagesize=A4)
-        self._draw_header(data)
-        self._draw_bill_to_and_invoice_details(data)
-        self._draw_items_table(data['items'], data['totals']['decimalPoint'], True)
-        self._draw_totals_and_payment_method(data)
-        #self._draw_footer(data)
-        self.c.save()
-        print(f"PDF generated successfully at {self.file_path}")
\ No newline at end of file
+                        style='signature_title', alignment='center')
+    def _create_canvas(self, target, data):
+        details = data['invoiceDetails']
+        if self.deterministic:
+            # invariant pins the timestamp and derives the document ID from the content
+            self.c = StateCanvas(target, pagesize=A4, invariant=1)
+            date_formatter = _pdf_date_formatter(details.get('invoiceDate'))
+            if date_formatter is not None:
+                self.c.setDateFormatter(date_formatter)
+        else:
+            self.c = StateCanvas(target, pagesize=A4)
+        self.c.setTitle(f"Quote {details['accountNo']}")
+        self.c.setAuthor(data['header'].get('companyName', ''))
+        self.c.setCreator("product-quotation")
+
+    def create_pdf(self, data, output=None):
+        """
+        Main method to create the PDF document.
+
+        :param output: Optional file-like object (e.g. io.BytesIO) written instead of file_path
+        :return: The PDF as bytes when there is neither an output nor a file_path, else None
+        """
+        buffer = None
+        target = output if output is not None else self.file_path
+        if target is None:
+            buffer = target = io.BytesIO()
+
+        self.data = data
+        start = time.perf_counter()
+        try:
+            with metrics.collect() as timings:
+                self._create_canvas(target, data)
+                with metrics.timer("draw_header"):
+                    self._draw_header(data)
+                with metrics.timer("draw_bill_to"):
+                    self._draw_bill_to_and_invoice_details(data)
+                with metrics.timer("draw_items_table"):
+                    self._draw_items_table(data['items'], data['totals']['decimalPoint'], True)
+                with metrics.timer("draw_totals"):
+                    self._draw_totals_and_payment_method(data)
+                #self._draw_footer(data)
+                with metrics.timer("canvas_save"):
+                    self.c.save()
+        except Exception:
+            metrics.inc("render_errors_total")
+            raise
+        elapsed = time.perf_counter() - start
+
+        metrics.observe("quote_render_seconds", elapsed)
+        metrics.inc("quotes_rendered_total")
+        metrics.inc("quote_items_total", len(data['items']))
+        breakdown = ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in timings.items())
+        if elapsed >= SLOW_RENDER_SECONDS:
+            logger.warning("Slow render of %d items in %.2fs: %s", len(data['items']), elapsed, breakdown)
+        else:
+            logger.debug("Rendered %d items in %.1f ms: %s", len(data['items']), elapsed * 1000, breakdown)
+
+        if buffer is not None:
+            return buffer.getvalue()
+        if output is None:
+            logger.info("PDF generated successfully at %s", self.file_path)
+
+    def create_pdf_buffer(self, data):
+        """Renders the PDF in memory and returns a memoryview over it, without copying."""
+        buffer = io.BytesIO()
+        self.create_pdf(data, output=buffer)
+        return buffer.getbuffer()
@@ -0,0 +1,271 @@
+"""
+Drawing layer of the PDF renderer.
+
+StateCanvas is a reportlab canvas that remembers the font and colours it
+last emitted and skips the operators that would not change them, so drawing
+many strings in the same style only sets the style once. TextBatch collects
+the strings of a table row into one text object instead of one per string.
+Text styles are named in STYLES, built once per process.
+
+Text widths are measured through string_width(), an LRU cache keyed by
+(text, font, size): the catalog labels repeated over thousands of lines are
+measured once. wrap_text() and ellipsize() fit text to a column width.
+
+    c = StateCanvas(buffer, pagesize=A4)
+    batch = TextBatch(c)
+    batch.draw("Rhodes", x, y, STYLES["cell"])
+    batch.draw("12,50", x2, y, STYLES["cell"], alignment="right")
+    batch.flush()
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+
+TextStyle = namedtuple("TextStyle", ["font_name", "font_size", "color"])
+
+# Measured (text, font, size) combinations kept per process
+STRING_WIDTH_CACHE_SIZE = 16384
+# Wrapped cell texts kept per process
+WRAP_CACHE_SIZE = 4096
+ELLIPSIS = "\u2026"
+
+
+def _style(font_name, font_size, color):
+    return TextStyle(font_name, font_size, colors.HexColor(color) if isinstance(color, str) else color)
+
+
+# Every text style of a quote
+STYLES = {
+    # Header
+    "logo_placeholder": _style("Helvetica-Bold", 20, colors.white),
+    "company_contact": _style("Charter-Bold", 11, "#D5D5D5"),
+    "company_legal": _style("Charter-Bold", 8, "#D5D5D5"),
+    # Bill to and invoice details
+    "bill_to_label": _style("Charter", 12, "#C9B7A1"),
+    "bill_to_name": _style("Charter-Bold", 12, "#666666"),
+    "body": _style("Charter", 10, "#666666"),
+    "body_bold": _style("Charter-Bold", 10, "#666666"),
+    "bill_to_legal": _style("Charter", 7, "#5E5E5E"),
+    "invoice_title": _style("Times-Roman", 18, "#313B4B"),
+    "invoice_detail_label": _style("Times-Roman", 8, "#666666"),
+    "invoice_detail_value": _style("Times-Roman-Bold", 8, "#666666"),
+    # Items table
+    "table_header": _style("Georgia-Bold", 10, "#5E5E5E"),
+    "cell": _style("Charter", 10, "#333333"),
+    "cell_hidden": _style("Charter", 10, "#FFFFFF"),
+    # Totals and payment method
+    "section_title": _style("Charter", 10, "#C9B7A1"),
+    "payment_method": _style("Charter-Bold", 11, "#666666"),
+    "total_label": _style("Georgia-Bold", 10, "#717070"),
+    "total_value": _style("Charter", 10, "#717070"),
+    "grand_total_label": _style("Georgia-Bold", 10, "#FFFFFF"),
+    "grand_total_value": _style("Charter", 10, "#FFFFFF"),
+    # Footer
+    "thank_you": _style("Charter-Bold", 13, "#C9B7A1"),
+    "signature": _style("Rounhand-Bold", 14, "#333333"),
+    "signature_name": _style("Times-Roman-Bold", 12, "#333333"),
+    "signature_title": _style("Times-Roman", 12, "#333333"),
+}
+
+
+@lru_cache(maxsize=STRING_WIDTH_CACHE_SIZE)
+def string_width(text, font_name, font_size):
+    return pdfmetrics.stringWidth(text, font_name, font_size)
+
+
+def ellipsize(text, font_name, font_size, width):
+    """Returns text, shortened and ending with an ellipsis when it is wider than width."""
+    if string_width(text, font_name, font_size) <= width:
+        return text
+    # Longest prefix that still fits with the ellipsis
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if string_width(text[:middle].rstrip() + ELLIPSIS, font_name, font_size) <= width:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + ELLIPSIS
+
+
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def wrap_text(text, font_name, font_size, width, max_lines=None):
+    """
+    Splits text into lines no wider than width, breaking between words.
+    A word wider than width, or the text left after max_lines, is ellipsized.
+
+    :return: Tuple of lines, ('',) for an empty text
+    """
+    lines = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if string_width(candidate, font_name, font_size) <= width:
+            current = candidate
+            continue
+        if current:
+            lines.append(current)
+        current = word
+        if string_width(word, font_name, font_size) > width:
+            lines.append(ellipsize(word, font_name, font_size, width))
+            current = ""
+    if current or not lines:
+        lines.append(current)
+    if max_lines and len(lines) > max_lines:
+        rest = " ".join(lines[max_lines - 1:])
+        lines = lines[:max_lines - 1] + [ellipsize(rest, font_name, font_size, width)]
+    return tuple(lines)
+
+
+def _color_key(color):
+    """Comparable value of a colour, None for colours that are always emitted (CMYK, names)."""
+    if isinstance(color, colors.CMYKColor):
+        return None
+    if isinstance(color, colors.Color):
+        return color.red, color.green, color.blue, color.alpha
+    if isinstance(color, (tuple, list)) and len(color) == 3:
+        return tuple(color) + (None,)
+    return None
+
+
+def _is_dynamic(font_name):
+    # TrueType fonts select their subset inside every text object
+    return pdfmetrics.getFont(font_name)._dynamicFont
+
+
+class StateCanvas(canvas.Canvas):
+    """
+    Canvas skipping setFont, setFillColor and setStrokeColor calls that repeat
+    the current value. What was emitted is tracked per content stream: it is
+    saved and restored with saveState/restoreState and forms, and forgotten
+    on a new page. A font is only skipped while the canvas font attributes
+    agree with it.
+    """
+    def __init__(self, *args, **kwargs):
+        # Last font (name, size, leading), fill and stroke keys emitted in the current stream
+        self._emitted = {}
+        self._emitted_stack = []
+        super().__init__(*args, **kwargs)
+
+    def _elide(self, kind, key):
+        """True when key was already emitted, else records it as emitted."""
+        if key is not None and self._emitted.get(kind) == key:
+            return True
+        self._emitted[kind] = key
+        return False
+
+    def _canvas_font(self):
+        """Font the canvas measures and draws strings with."""
+        return self._fontname, self._fontsize, self._leading
+
+    def _sync_font(self):
+        # After a restore the emitted font only counts if the canvas font is the same
+        if self._emitted.get("font") != self._canvas_font():
+            self._emitted.pop("font", None)
+
+    def setFont(self, psfontname, size, leading=None):
+        if leading is None:
+            leading = size * 1.2
+        key = None if _is_dynamic(psfontname) else (psfontname, size, leading)
+        # Skipped only when both the stream and the canvas already use the font
+        if key is not None and key == self._canvas_font() and self._emitted.get("font") == key:
+            return
+        self._emitted["font"] = key
+        super().setFont(psfontname, size, leading)
+
+    def setFillColor(self, aColor, alpha=None):
+        if self._elide("fill", _color_key(aColor) if alpha is None else None):
+            return
+        super().setFillColor(aColor, alpha)
+
+    def setStrokeColor(self, aColor, alpha=None):
+        if self._elide("stroke", _color_key(aColor) if alpha is None else None):
+            return
+        super().setStrokeColor(aColor, alpha)
+
+    def setFillGray(self, gray, alpha=None):
+        self._emitted.pop("fill", None)
+        super().setFillGray(gray, alpha)
+
+    def setStrokeGray(self, gray, alpha=None):
+        self._emitted.pop("stroke", None)
+        super().setStrokeGray(gray, alpha)
+
+    def stringWidth(self, text, fontName=None, fontSize=None):
+        # drawRightString, drawCentredString and text objects measure through here
+        return string_width(text, fontName or self._fontname, fontSize or self._fontsize)
+
+    def drawText(self, aTextObject):
+        super().drawText(aTextObject)
+        # The font and fill colour set inside a text object stay in effect after it
+        font_name = aTextObject._fontname
+        if _is_dynamic(font_name):
+            self._emitted.pop("font", None)
+        else:
+            self._emitted["font"] = (font_name, aTextObject._fontsize, aTextObject._leading)
+        fill = getattr(aTextObject, "_fillColorObj", None)
+        if fill is not None:
+            self._emitted["fill"] = _color_key(fill)
+        # Keep the canvas font in step with the stream, drawString and stringWidth rely on it
+        self._fontname, self._fontsize, self._leading = font_name, aTextObject._fontsize, aTextObject._leading
+
+    def saveState(self):
+        self._emitted_stack.append(dict(self._emitted))
+        super().saveState()
+
+    def restoreState(self):
+        super().restoreState()
+        self._emitted = self._emitted_stack.pop()
+        self._sync_font()
+
+    def beginForm(self, *args, **kwargs):
+        # A form inherits the state of the page it is placed on, nothing can be assumed
+        self._emitted_stack.append(self._emitted)
+        self._emitted = {}
+        super().beginForm(*args, **kwargs)
+
+    def endForm(self, **extra_attributes):
+        super().endForm(**extra_attributes)
+        self._emitted = self._emitted_stack.pop()
+        self._sync_font()
+
+    def showPage(self):
+        super().showPage()
+        self._emitted = {}
+
+
+class TextBatch:
+    """
+    Strings drawn into one shared text object, flushed to the canvas at once.
+    The style is only changed inside the text object when it differs.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._text = None
+        self._color = None
+
+    def draw(self, text, x, y, style, alignment="left"):
+        if self._text is None:
+            self._text = self.canvas.beginText()
+            # The fill colour of the canvas carries into the text object
+            self._color = getattr(self.canvas, "_emitted", {}).get("fill")
+        t = self._text
+        if (t._fontname, t._fontsize) != (style.font_name, style.font_size):
+            t.setFont(style.font_name, style.font_size)
+        color_key = _color_key(style.color)
+        if color_key is None or color_key != self._color:
+            t.setFillColor(style.color)
+            self._color = color_key
+        if alignment != "left":
+            width = string_width(text, style.font_name, style.font_size)
+            x -= width if alignment == "right" else width / 2
+        t.setTextOrigin(x, y)
+        t.textLine(text)
+
+    def flush(self):
+        if self._text is not None:
+            self.canvas.drawText(self._text)
+            self._text = None
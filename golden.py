@@ -0,0 +1,107 @@
+"""
+Golden-file regression check of the PDF renderer.
+
+Renders a fixed set of quotes in deterministic mode (PDFGenerator(deterministic=True))
+and compares the SHA-256 of every PDF with the hashes recorded by --save. Any
+change to the bytes of a quote - layout, fonts, images or reportlab - is
+reported, without opening the PDFs.
+
+Usage:
+    python golden.py --save                  # record the hashes on this machine
+    python golden.py                         # exit 1 when a PDF changed
+    python golden.py --out changed           # also write the changed PDFs there
+
+The quotes use pinned data (client, lines, reference and dates) and the
+settings file, so the hashes only need to be saved again after an intended
+change to the renderer or the settings.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from bench import make_lines, BENCH_CLIENT
+from catalog import catalog
+from create_pdf import PDFGenerator, register_fonts
+from metrics import configure_logging
+from pricing import price_entries
+from quote import load_settings, build_invoice_data
+
+GOLDEN_FILE = "golden_hashes.json"
+# Number of order lines of each golden quote: one line, one page, several pages
+GOLDEN_SIZES = [1, 20, 120]
+
+
+def golden_invoices(settings):
+    """:return: Dictionary {case name: invoice_data}"""
+    invoices = {}
+    for size in GOLDEN_SIZES:
+        entries = price_entries(make_lines(size, seed=size))
+        invoice_data = build_invoice_data(settings, BENCH_CLIENT, entries, invoice_no=f"GOLDEN-{size:04d}")
+        # Dates are pinned, they would change the quote every day
+        invoice_data["invoiceDetails"]["invoiceDate"] = "01/01/2026"
+        invoice_data["invoiceDetails"]["issueDate"] = "01/04/2026"
+        invoices[f"quote_{size}"] = invoice_data
+    return invoices
+
+
+def render_hashes(invoices):
+    """
+    :return: Tuple (dictionary {case name: sha256 hex}, dictionary {case name: PDF bytes})
+    """
+    hashes = {}
+    pdfs = {}
+    for name, invoice_data in invoices.items():
+        pdf_bytes = PDFGenerator(deterministic=True).create_pdf(invoice_data)
+        hashes[name] = hashlib.sha256(pdf_bytes).hexdigest()
+        pdfs[name] = pdf_bytes
+    return hashes, pdfs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the renderer still produces the recorded PDFs.")
+    parser.add_argument("--golden", default=GOLDEN_FILE, help=f"Hashes file (default: {GOLDEN_FILE})")
+    parser.add_argument("--save", action="store_true", help="Record the current hashes")
+    parser.add_argument("--out", help="Write the PDFs that changed to this folder")
+    parser.add_argument("--settings", default="settings.json", help="Settings file (default: settings.json)")
+    parser.add_argument("--log-level", default="WARNING", help="Log level (default: WARNING)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    settings = load_settings(args.settings)
+    if settings is None:
+        print(f"Settings file not found: {args.settings}")
+        return 2
+
+    register_fonts()
+    catalog.load_all()
+    hashes, pdfs = render_hashes(golden_invoices(settings))
+
+    if args.save:
+        with open(args.golden, "w") as f:
+            json.dump(hashes, f, indent=4)
+        print(f"Saved {len(hashes)} hashes to {args.golden}")
+        return 0
+
+    try:
+        with open(args.golden, "r") as f:
+            golden = json.load(f)
+    except FileNotFoundError:
+        print(f"No hashes in {args.golden}, run with --save first")
+        return 2
+
+    changed = [name for name in hashes if golden.get(name) != hashes[name]]
+    for name in hashes:
+        print(f"{name:<14}{'CHANGED' if name in changed else 'ok'}")
+    if changed and args.out:
+        os.makedirs(args.out, exist_ok=True)
+        for name in changed:
+            with open(os.path.join(args.out, f"{name}.pdf"), "wb") as f:
+                f.write(pdfs[name])
+        print(f"Changed PDFs written to {args.out}")
+    return 1 if changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
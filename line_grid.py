@@ -0,0 +1,230 @@
+"""
+Order-line table of the GUI form.
+
+The lines are plain lists of strings kept in LineGrid.lines and shown in a
+ttk.Treeview, which only draws the rows that are visible. There are no
+widgets per line: a single editor (combobox or entry) is placed over the cell
+being edited, so adding, deleting and scrolling stay fast with thousands of
+lines.
+
+Variant and colour cells are edited with type-ahead: the dropdown is filtered
+with the catalog search index on every keystroke, Return picks the best match.
+"""
+import itertools
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from catalog import catalog, COLORS
+
+MAX_COLORS = 5
+
+# Matches listed in the dropdown while typing
+TYPE_AHEAD_LIMIT = 50
+
+# Keys that move in the dropdown instead of changing the query
+NAVIGATION_KEYS = {"Return", "KP_Enter", "Escape", "Up", "Down", "Left", "Right", "Tab", "Home", "End"}
+
+# Column id, heading, width in pixels
+COLUMNS = [("model", "Model", 110), ("variant", "Variant", 160), ("qty", "Qty", 60)] + [
+    (f"color{i}", f"Color {i}", 180) for i in range(1, MAX_COLORS + 1)
+]
+COLUMN_IDS = [column_id for column_id, _, _ in COLUMNS]
+
+MODEL, VARIANT, QTY = 0, 1, 2
+FIRST_COLOR = 3
+
+
+class LineGrid(tk.Frame):
+    def __init__(self, master, families, **kwargs):
+        super().__init__(master, **kwargs)
+        self.families = families
+        # item id -> [model, variant, qty, color1, ..., color5]
+        self.lines = {}
+        self._ids = itertools.count(1)
+
+        # Editor currently placed over a cell: (widget, item id, column index)
+        self._editing = None
+
+        self.tree = ttk.Treeview(self, columns=COLUMN_IDS, show="headings", selectmode="extended")
+        for column_id, heading, width in COLUMNS:
+            self.tree.heading(column_id, text=heading)
+            self.tree.column(column_id, width=width, minwidth=40, stretch=False)
+
+        v_scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._yview)
+        h_scrollbar = ttk.Scrollbar(self, orient="horizontal", command=self._xview)
+        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        v_scrollbar.grid(row=0, column=1, sticky="ns")
+        h_scrollbar.grid(row=1, column=0, sticky="ew")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        # One editor of each kind, reused for every cell
+        self._combobox = ttk.Combobox(self.tree, state="readonly")
+        self._combobox.bind("<<ComboboxSelected>>", lambda e: self._commit_edit())
+        self._combobox.bind("<KeyRelease>", self._on_type)
+        self._combobox.bind("<Return>", lambda e: self._commit_edit())
+        self._entry = tk.Entry(self.tree)
+        self._entry.bind("<Return>", lambda e: self._commit_edit())
+        self._entry.bind("<FocusOut>", lambda e: self._commit_edit())
+        for editor in (self._combobox, self._entry):
+            editor.bind("<Escape>", lambda e: self._close_editor())
+
+        self.tree.bind("<Double-1>", self._on_double_click)
+        self.tree.bind("<Return>", self._on_return)
+        self.tree.bind("<Delete>", lambda e: self.delete_selected())
+        # The editor follows the cell it belongs to, keep what was typed and close it when the view moves
+        self.tree.bind("<Button-1>", lambda e: self._commit_edit(), add="+")
+        self.tree.bind("<MouseWheel>", lambda e: self._commit_edit(), add="+")
+        self.tree.bind("<Button-4>", lambda e: self._commit_edit(), add="+")
+        self.tree.bind("<Button-5>", lambda e: self._commit_edit(), add="+")
+
+    def _yview(self, *args):
+        self._commit_edit()
+        self.tree.yview(*args)
+
+    def _xview(self, *args):
+        self._commit_edit()
+        self.tree.xview(*args)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def add_line(self, model="", variant="", qty="1", colors=()):
+        """Appends a line and returns its item id."""
+        colors = list(colors)[:MAX_COLORS]
+        values = [model, variant, str(qty)] + colors + [""] * (MAX_COLORS - len(colors))
+        item_id = f"L{next(self._ids)}"
+        self.lines[item_id] = values
+        self.tree.insert("", "end", iid=item_id, values=values)
+        return item_id
+
+    def delete_selected(self):
+        self._commit_edit()
+        selection = self.tree.selection()
+        if selection:
+            self.tree.delete(*selection)
+            for item_id in selection:
+                del self.lines[item_id]
+
+    def get_lines(self):
+        """Order lines in display order, as expected by pricing.price_entries()."""
+        return [
+            {
+                "model": values[MODEL],
+                "variant": values[VARIANT],
+                "qty": values[QTY],
+                "colors": values[FIRST_COLOR:]
+            }
+            for values in map(self.lines.__getitem__, self.tree.get_children())
+        ]
+
+    def set_value(self, item_id, column, value):
+        values = self.lines[item_id]
+        values[column] = value
+        if column == MODEL:
+            # A new model resets the variant to its first one, as before
+            variants = catalog.variants(value)
+            values[VARIANT] = variants[0] if variants else ""
+        self.tree.item(item_id, values=values)
+
+    def refresh_choices(self):
+        """Called after catalogs were reloaded, an open dropdown gets the new names."""
+        if self._editing is not None and self._editing[0] is self._combobox:
+            _, item_id, column = self._editing
+            self._combobox['values'] = self._choices(item_id, column)
+
+    def _catalog_name(self, item_id, column):
+        return self.lines[item_id][MODEL] if column == VARIANT else COLORS
+
+    def _choices(self, item_id, column, query=""):
+        if column == MODEL:
+            return self.families
+        if not query:
+            if column == VARIANT:
+                return catalog.variants(self.lines[item_id][MODEL])
+            return [""] + catalog.colors()
+        return catalog.search(self._catalog_name(item_id, column), query, TYPE_AHEAD_LIMIT)
+
+    def _on_type(self, event):
+        if self._editing is None or event.keysym in NAVIGATION_KEYS:
+            return
+        _, item_id, column = self._editing
+        if column != MODEL:
+            self._combobox['values'] = self._choices(item_id, column, self._combobox.get())
+
+    def _resolve(self, item_id, column, text):
+        """Turns the typed text of a variant or colour cell into a catalog name."""
+        if column == MODEL or (not text and column != VARIANT):
+            return text
+        entry = catalog.lookup(self._catalog_name(item_id, column), text)
+        if entry is not None:
+            return entry.name
+        matches = self._choices(item_id, column, text)
+        # Nothing matches: keep the previous value
+        return matches[0] if matches else self.lines[item_id][column]
+
+    def _on_double_click(self, event):
+        if self.tree.identify_region(event.x, event.y) != "cell":
+            return
+        item_id = self.tree.identify_row(event.y)
+        # identify_column returns '#1' for the first column
+        column = int(self.tree.identify_column(event.x)[1:]) - 1
+        if item_id:
+            self.edit_cell(item_id, column)
+
+    def _on_return(self, event):
+        item_id = self.tree.focus()
+        if item_id:
+            self.edit_cell(item_id, MODEL)
+
+    def edit_cell(self, item_id, column):
+        """Places the editor over a cell, the cell being edited keeps its new value."""
+        self._commit_edit()
+        self.tree.see(item_id)
+        bbox = self.tree.bbox(item_id, COLUMN_IDS[column])
+        if not bbox:
+            return
+        x, y, width, height = bbox
+        value = self.lines[item_id][column]
+
+        if column == QTY:
+            editor = self._entry
+            editor.delete(0, tk.END)
+            editor.insert(0, value)
+            editor.select_range(0, tk.END)
+        else:
+            editor = self._combobox
+            # The model is picked from the list, variants and colours can be typed
+            editor.configure(state="readonly" if column == MODEL else "normal")
+            editor['values'] = self._choices(item_id, column)
+            editor.set(value)
+            if column != MODEL:
+                editor.select_range(0, tk.END)
+
+        self._editing = (editor, item_id, column)
+        editor.place(x=x, y=y, width=width, height=height)
+        editor.focus_set()
+
+    def _commit_edit(self):
+        if self._editing is None:
+            return
+        editor, item_id, column = self._editing
+        self._editing = None
+        value = editor.get().strip()
+        if column == QTY and (not value.isdigit() or int(value) < 1):
+            messagebox.showwarning("Invalid Quantity", "Quantity must be a number greater than 0.")
+            value = "1"
+        editor.place_forget()
+        if item_id in self.lines:
+            if editor is self._combobox:
+                value = self._resolve(item_id, column, value)
+            self.set_value(item_id, column, value)
+        self.tree.focus_set()
+
+    def _close_editor(self):
+        """Closes the editor without keeping what was typed (Escape)."""
+        if self._editing is not None:
+            self._editing[0].place_forget()
+            self._editing = None
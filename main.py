@@ -1,9 +1,14 @@
+import startup  # first, startup times are measured from here
 from tkinter import Tk
 from gui import UserFormApp
+from metrics import configure_logging
 
 def main():
+    configure_logging()
+    startup.mark("imports done")
     root = Tk()
     app = UserFormApp(root)
+    startup.mark("widgets built")
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+"""
+Timing and counters for quote generation.
+
+Stages are timed with metrics.timer(stage), which feeds the
+quote_stage_seconds histogram. metrics.collect() gathers the stage times of
+one quote on the current thread, e.g. to log the breakdown of a slow quote or
+to send it back from a worker process (record_stages() adds it to the
+registry of the parent). metrics.collect_delta() does the same for counters
+and the other histograms, merge() adds them to the registry of the parent.
+
+    with metrics.collect() as timings:
+        entries = price_entries(lines)
+        pdf = PDFGenerator().create_pdf(build_invoice_data(settings, client, entries))
+    # timings == {"pricing": 0.002, "conversion": 0.0001, "draw_header": ..., ...}
+
+    # In a worker process
+    with metrics.collect() as timings, metrics.collect_delta() as delta:
+        pdf = render(order)
+    return pdf, timings, delta
+    # In the parent
+    metrics.record_stages(timings)
+    metrics.merge(delta)
+
+The registry is exported with to_json() or to_prometheus() (text format 0.0.4).
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STAGE_METRIC = "quote_stage_seconds"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def configure_logging(level=None):
+    """
+    Sets up logging for the command line tools and the GUI.
+    The level defaults to the QUOTE_LOG_LEVEL environment variable, else INFO.
+    """
+    level = (level or os.environ.get("QUOTE_LOG_LEVEL") or "INFO").upper()
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (name, label key) -> value
+        self._counters = {}
+        self._histograms = {}
+        self._local = threading.local()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        deltas = self._deltas()
+        if deltas:
+            counters = deltas[-1]["counters"]
+            counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+        deltas = self._deltas()
+        # Stage times travel with collect()
+        if deltas and name != STAGE_METRIC:
+            deltas[-1]["observations"].append(key + (value,))
+
+    def _collectors(self):
+        collectors = getattr(self._local, "collectors", None)
+        if collectors is None:
+            collectors = self._local.collectors = []
+        return collectors
+
+    def _deltas(self):
+        deltas = getattr(self._local, "deltas", None)
+        if deltas is None:
+            deltas = self._local.deltas = []
+        return deltas
+
+    @contextmanager
+    def collect(self):
+        """Gathers {stage: seconds} of the stages timed on this thread inside the block."""
+        timings = {}
+        collectors = self._collectors()
+        collectors.append(timings)
+        try:
+            yield timings
+        finally:
+            collectors.pop()
+            # Nested blocks also count for the enclosing one
+            if collectors:
+                outer = collectors[-1]
+                for stage, seconds in timings.items():
+                    outer[stage] = outer.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(STAGE_METRIC, elapsed, stage=stage)
+            collectors = self._collectors()
+            if collectors:
+                collectors[-1][stage] = collectors[-1].get(stage, 0.0) + elapsed
+            logger.debug("%s took %.2f ms", stage, elapsed * 1000)
+
+    def record_stages(self, timings):
+        """Adds stage times measured elsewhere, e.g. returned by a worker process."""
+        for stage, seconds in timings.items():
+            self.observe(STAGE_METRIC, seconds, stage=stage)
+
+    @contextmanager
+    def collect_delta(self):
+        """
+        Gathers the counter increments and histogram observations (stage times
+        excepted) made on this thread inside the block, in a picklable dictionary.
+        """
+        delta = {"counters": {}, "observations": []}
+        deltas = self._deltas()
+        deltas.append(delta)
+        try:
+            yield delta
+        finally:
+            deltas.pop()
+            # Nested blocks also count for the enclosing one
+            if deltas:
+                outer = deltas[-1]
+                for key, value in delta["counters"].items():
+                    outer["counters"][key] = outer["counters"].get(key, 0) + value
+                outer["observations"].extend(delta["observations"])
+
+    def merge(self, delta):
+        """Adds counters and observations gathered by collect_delta(), e.g. in a worker process."""
+        for (name, label_key), value in delta["counters"].items():
+            self.inc(name, value, **dict(label_key))
+        for name, label_key, value in delta["observations"]:
+            self.observe(name, value, **dict(label_key))
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def snapshot(self):
+        """Plain dictionary of every counter and histogram."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": {
+                        "+Inf" if math.isinf(bound) else str(bound): count
+                        for bound, count in zip(histogram.buckets, histogram.cumulative_counts())
+                    }
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self, indent=None):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in snapshot["counters"]:
+            if counter["name"] not in typed:
+                typed.add(counter["name"])
+                lines.append(f"# TYPE {counter['name']} counter")
+            labels = _format_labels(sorted(counter["labels"].items()))
+            lines.append(f"{counter['name']}{labels} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name = histogram["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            label_key = sorted(histogram["labels"].items())
+            for bound, count in histogram["buckets"].items():
+                lines.append(f"{name}_bucket{_format_labels(label_key, [('le', bound)])} {count}")
+            lines.append(f"{name}_sum{_format_labels(label_key)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(label_key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
@@ -1,79 +1,59 @@
 import csv
-import os
-import sys
+import io
+from resources import resource_path
 
 class Model:
     def __init__(self, relative_path: str):
-        # If running as a PyInstaller bundle, use the temporary _MEIPASS path
-        if getattr(sys, 'frozen', False):
-            base_path = sys._MEIPASS  # PyInstaller extracts to this temp dir
-        else:
-            base_path = os.path.dirname(__file__)
-
-        self.file_path = os.path.join(base_path, relative_path)
+        # Resolves to the PyInstaller _MEIPASS folder when running as a bundle
+        self.file_path = resource_path(relative_path)
         self.col_model = 'Nom_Model'
         self.col_price = 'Prix'
     
-    def extract_model_prix(self):
+    def extract_rows(self, content=None):
+        """
+        Reads a semicolon-delimited CSV file and returns the 'Nom_Model'
+        and 'Prix' columns of every row, as written in the file.
+
+        :param content: Already read CSV text, the file is read when omitted
+        :return: List of tuples (col_model, col_price), missing cells are None
+        """
+        if content is None:
+            with open(self.file_path, mode='r', newline='', encoding='utf-8') as file:
+                content = file.read()
+        reader = csv.DictReader(io.StringIO(content, newline=''), delimiter=';')
+        return [(row.get(self.col_model), row.get(self.col_price)) for row in reader]
+
+    def extract_model_prix(self, content=None):
         """
         Reads a semicolon-delimited CSV file and returns a dictionary
         with 'Nom_Model' as keys and 'Prix' as values.
 
-        :param file_path: Path to the CSV file
+        :param content: Already read CSV text, the file is read when omitted
         :return: Dictionary {col_model: col_price}
         """
         result = {}
-        with open(self.file_path, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file, delimiter=';')
-            for row in reader:
-                nom_model = row.get(self.col_model)
-                prix = row.get(self.col_price)
-                if nom_model is not None and prix is not None:
-                    result[nom_model] = prix
+        for name, prix in self.extract_rows(content):
+            if name is not None and prix is not None:
+                result[name] = prix
         return result
-    
-    
-# Extract CSV_Modeles_Baguettes
-csv_baguettes_filepath = "CSV/CSV_Modeles_Baguettes.csv"
-# Create instance of model
-csv_baguettes_model = Model(csv_baguettes_filepath)
-# Extract csv file and store in a dict
-csv_baguettes_dict = csv_baguettes_model.extract_model_prix()
-# Get keys and store them in a list
-csv_baguettes_keys_list = list(csv_baguettes_dict.keys())
 
-# Extract CSV_Modeles_Carre / Square
-csv_carre_filepath = "CSV/CSV_Modeles_Carre.csv"
-# Create instance of model
-csv_carre_model = Model(csv_carre_filepath)
-# Extract csv file and store in a dict
-csv_carre_dict = csv_carre_model.extract_model_prix()
-# Get keys and store them in a list
-csv_carre_keys_list = list(csv_carre_dict.keys())
 
-# Extract CSV_Modeles_Frise
-csv_frise_filepath = "CSV/CSV_Modeles_Frise.csv"
-# Create instance of model
-csv_frise_model = Model(csv_frise_filepath)
-# Extract csv file and store in a dict
-csv_frise_dict = csv_frise_model.extract_model_prix()
-# Get keys and store them in a list
-csv_frise_keys_list = list(csv_frise_dict.keys())
+# The catalogs are no longer parsed at import time, see catalog.py.
+# The former module-level names are still available and load on first access.
+_LEGACY_NAMES = {
+    "csv_baguettes": "Baguettes",
+    "csv_carre": "Square",
+    "csv_frise": "Frieze",
+    "csv_hexa": "Hexagonal",
+    "csv_tapis": "Berber Carpet",
+}
 
-# Extract CSV_Modeles_Hexa
-csv_hexa_filepath = "CSV/CSV_Modeles_Hexa.csv"
-# Create instance of model
-csv_hexa_model = Model(csv_hexa_filepath)
-# Extract csv file and store in a dict
-csv_hexa_dict = csv_hexa_model.extract_model_prix()
-# Get keys and store them in a list
-csv_hexa_keys_list = list(csv_hexa_dict.keys())
 
-# Extract CSV_Modeles_Tapis / Berber Carpet
-csv_tapis_filepath = "CSV/CSV_Modeles_Tapis.csv"
-# Create instance of model
-csv_tapis_model = Model(csv_tapis_filepath)
-# Extract csv file and store in a dict
-csv_tapis_dict = csv_tapis_model.extract_model_prix()
-# Get keys and store them in a list
-csv_tapis_keys_list = list(csv_tapis_dict.keys())
\ No newline at end of file
+def __getattr__(name):
+    for prefix, family in _LEGACY_NAMES.items():
+        if name in (f"{prefix}_dict", f"{prefix}_keys_list"):
+            from catalog import catalog
+            if name.endswith("_dict"):
+                return {entry.name: entry.price for entry in catalog.get(family).entries.values()}
+            return catalog.keys(family)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,231 @@
+"""
+Sequential, year-prefixed quote references (2026-000001, 2026-000002, ...).
+
+The last number handed out for each year is kept in a small SQLite file.
+Every allocation is one BEGIN IMMEDIATE transaction, which takes the write
+lock of the file, so threads and processes (GUI, batch workers, service
+workers) never receive the same number and the counter never skips one.
+
+A batch reserves all the numbers it needs in one transaction with reserve()
+or a NumberBlock instead of locking once per quote. Numbers that end up on
+no quote - unused numbers of a block, quotes that failed or were cancelled
+after receiving their number - are given back with release(): the counter
+goes back when nobody allocated after them, else they are kept and handed
+out again first by next() and references(), so the references stay gap-free.
+
+    allocator = get_allocator()
+    allocator.next()                    # '2026-000042'
+    year, first, last = allocator.reserve(1000)
+    with allocator.block(1000) as block:
+        block.next()
+    allocator.release_references(['2026-000042'])
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+NUMBERING_FILE = "quote_numbers.db"
+NUMBER_FORMAT = "{year}-{number:06d}"
+
+# Matches the references of NUMBER_FORMAT
+NUMBER_RE = re.compile(r"^(\d{4})-(\d{6,})$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quote_numbers (
+    year INTEGER PRIMARY KEY,
+    last INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS released_numbers (
+    year INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    PRIMARY KEY (year, number)
+);
+"""
+
+
+def format_number(year, number):
+    return NUMBER_FORMAT.format(year=year, number=number)
+
+
+def parse_reference(reference):
+    """:return: Tuple (year, number), None for a reference not made by the allocator"""
+    match = NUMBER_RE.match(reference or "")
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class NumberAllocator:
+    def __init__(self, path=NUMBERING_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _transaction(self, work):
+        """Runs work() in one BEGIN IMMEDIATE transaction, the caller holds self._lock."""
+        # Waits (up to the connection timeout) for other processes holding the write lock
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = work()
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        return result
+
+    def _claim(self, year, count):
+        """Moves the counter of year count numbers forward, inside a transaction."""
+        row = self._connection.execute("SELECT last FROM quote_numbers WHERE year = ?", (year,)).fetchone()
+        first = (row[0] if row else 0) + 1
+        last = first + count - 1
+        self._connection.execute(
+            "INSERT INTO quote_numbers (year, last) VALUES (?, ?) "
+            "ON CONFLICT(year) DO UPDATE SET last = excluded.last", (year, last))
+        return first, last
+
+    def reserve(self, count, year=None):
+        """
+        Claims count consecutive numbers of a year in one transaction.
+
+        :param year: Defaults to the current year
+        :return: Tuple (year, first number, last number)
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        year = year or datetime.now().year
+        with self._lock:
+            first, last = self._transaction(lambda: self._claim(year, count))
+        logger.debug("Reserved quote numbers %d-%d of %d", first, last, year)
+        return year, first, last
+
+    def next(self):
+        """Allocates one reference."""
+        return self.references(1)[0]
+
+    def references(self, count):
+        """
+        Allocates count references of the current year in one transaction:
+        released numbers first, then consecutive new ones.
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        year = datetime.now().year
+
+        def allocate():
+            numbers = [row[0] for row in self._connection.execute(
+                "SELECT number FROM released_numbers WHERE year = ? ORDER BY number LIMIT ?", (year, count))]
+            self._connection.executemany(
+                "DELETE FROM released_numbers WHERE year = ? AND number = ?", ((year, number) for number in numbers))
+            if len(numbers) < count:
+                first, last = self._claim(year, count - len(numbers))
+                numbers += range(first, last + 1)
+            return numbers
+
+        with self._lock:
+            numbers = self._transaction(allocate)
+        return [format_number(year, number) for number in numbers]
+
+    def release(self, year, first_unused, last):
+        """
+        Gives back the numbers first_unused..last, which are on no quote.
+
+        :return: True when the counter went back, False when numbers were allocated
+                 after them and they are kept to be handed out again
+        """
+        def give_back():
+            row = self._connection.execute("SELECT last FROM quote_numbers WHERE year = ?", (year,)).fetchone()
+            if row is None or row[0] != last:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO released_numbers (year, number) VALUES (?, ?)",
+                    ((year, number) for number in range(first_unused, last + 1)))
+                return False
+            # Released numbers right below become the end of the counter too
+            new_last = first_unused - 1
+            while new_last > 0 and self._connection.execute(
+                    "DELETE FROM released_numbers WHERE year = ? AND number = ?", (year, new_last)).rowcount:
+                new_last -= 1
+            self._connection.execute("UPDATE quote_numbers SET last = ? WHERE year = ?", (new_last, year))
+            return True
+
+        with self._lock:
+            rolled_back = self._transaction(give_back)
+        logger.debug("Released quote numbers %d-%d of %d", first_unused, last, year)
+        return rolled_back
+
+    def release_references(self, references):
+        """Gives back references handed out by this allocator that are on no quote, others are ignored."""
+        numbers = sorted(filter(None, map(parse_reference, references)), reverse=True)
+        # Newest first, so the counter goes back as far as possible
+        for year, number in numbers:
+            self.release(year, number, number)
+
+    def block(self, size=1000):
+        return NumberBlock(self, size)
+
+
+class NumberBlock:
+    """
+    Numbers reserved size at a time, handed out one by one without locking
+    the database. A new block is reserved when this one is used up or the
+    year changed. Use it as a context manager to release the unused numbers.
+    """
+    def __init__(self, allocator, size=1000):
+        self.allocator = allocator
+        self.size = size
+        self._lock = threading.Lock()
+        self._year = None
+        self._next = 1
+        self._last = 0
+
+    def next(self):
+        with self._lock:
+            year = datetime.now().year
+            if self._next > self._last or self._year != year:
+                self._release()
+                self._year, self._next, self._last = self.allocator.reserve(self.size, year)
+            number = self._next
+            self._next += 1
+            return format_number(self._year, number)
+
+    def _release(self):
+        if self._year is not None and self._next <= self._last:
+            self.allocator.release(self._year, self._next, self._last)
+        self._year = None
+
+    def release(self):
+        with self._lock:
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(path=NUMBERING_FILE):
+    """Returns the allocator of a numbering file for this process."""
+    # Keyed by process too: a SQLite connection must not be used after a fork
+    key = (os.path.abspath(path), os.getpid())
+    with _allocators_lock:
+        allocator = _allocators.get(key)
+        if allocator is None:
+            allocator = _allocators[key] = NumberAllocator(path)
+        return allocator
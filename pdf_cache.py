@@ -0,0 +1,146 @@
+"""
+Content-addressed disk cache of rendered quotes.
+
+A PDF is stored under the SHA-256 of its final invoice_data together with
+renderer_fingerprint() (renderer and reportlab versions, fonts, icons and
+logo), so an identical quote - a re-send, or the orders of a batch that
+already rendered on a previous run - is read back instead of rendered. Any
+change to the data, the layout version or one of the files gives another key.
+
+Entries are files CACHE_DIR/<2 hex>/<sha256>.pdf. A hit refreshes the
+modification time of its file, and once the cache grows over max_bytes the
+least recently used files are removed. Processes may share the directory:
+files are written atomically and eviction tolerates files removed by others.
+PDFs are rendered in deterministic mode, so a hit returns exactly the bytes
+a new render would give.
+
+    cache = PDFCache()
+    pdf_bytes = cache.render(invoice_data)
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = ".pdf_cache"
+DEFAULT_MAX_MB = 500
+
+# Eviction removes files until the cache is below this share of max_bytes
+EVICT_TO = 0.9
+
+
+class PDFCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Estimate kept per process, recomputed by every eviction scan
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def key(self, invoice_data):
+        """Hex SHA-256 of invoice_data and the renderer fingerprint, in canonical JSON."""
+        from create_pdf import renderer_fingerprint
+        canonical = json.dumps({"data": invoice_data, "renderer": renderer_fingerprint(invoice_data)},
+                               sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pdf")
+
+    def get(self, key):
+        """Stored PDF bytes, None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            # The modification time is the LRU order
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.inc("pdf_cache_misses_total")
+            return None
+        metrics.inc("pdf_cache_hits_total")
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".pdf-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self._size += len(pdf_bytes)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def render(self, invoice_data):
+        """
+        PDF bytes of invoice_data, read from the cache or rendered and stored.
+        A cache that cannot be read or written only costs a render.
+        """
+        from create_pdf import PDFGenerator
+        try:
+            key = self.key(invoice_data)
+            pdf_bytes = self.get(key)
+        except OSError as e:
+            logger.warning("PDF cache unavailable: %s", e)
+            return PDFGenerator(deterministic=True).create_pdf(invoice_data)
+        if pdf_bytes is not None:
+            logger.debug("PDF cache hit for %s", invoice_data['invoiceDetails']['accountNo'])
+            return pdf_bytes
+
+        pdf_bytes = PDFGenerator(deterministic=True).create_pdf(invoice_data)
+        try:
+            self.put(key, pdf_bytes)
+        except OSError as e:
+            logger.warning("Could not store PDF in cache: %s", e)
+        return pdf_bytes
+
+    def _entries(self):
+        """(path, size, mtime) of every cached PDF."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """Removes the least recently used PDFs until the cache is below EVICT_TO of max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            size = sum(entry[1] for entry in entries)
+            target = self.max_bytes * EVICT_TO
+            removed = 0
+            for path, file_size, _ in entries:
+                if size <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                size -= file_size
+            self._size = size
+        if removed:
+            metrics.inc("pdf_cache_evictions_total", removed)
+            logger.debug("Evicted %d PDFs from the cache, %.1f MiB left", removed, size / 1024 / 1024)
@@ -0,0 +1,232 @@
+"""
+Pricing rules, independent of the GUI.
+
+unit price = variant price
+           + average price of the selected colours (unknown colours are ignored)
+           + COLOR_SUPPLEMENT_PER_COLOR_DA_PRICE for every selected colour
+total      = unit price * quantity
+
+All amounts are in Dinar. Lines are priced together with NumPy arrays, and
+the unit price of every (model, variant, colours) combination is memoized
+until a catalog is reloaded.
+
+Orders that do not come from the GUI form are checked with validate_lines()
+first: unknown names would otherwise be priced 0 without notice.
+"""
+import threading
+import numpy as np
+from catalog import catalog, COLORS
+from metrics import metrics
+
+COLOR_SUPPLEMENT_PER_COLOR_DA_PRICE = 250 # fixed price for every color supplement
+MAX_COLORS = 5
+
+# Memoized combinations kept before the cache is emptied
+MAX_CACHED_COMBINATIONS = 100000
+
+
+class InvalidOrder(ValueError):
+    """An order or invoice_data that cannot be priced or rendered as written."""
+
+
+def parse_qty(qty):
+    if type(qty) is int:
+        return qty if qty > 0 else 1
+    qty_str = str(qty).strip()
+    return int(qty_str) if qty_str.isdigit() and int(qty_str) > 0 else 1
+
+
+def strict_qty(qty):
+    """Quantity of an order line, None when it is not a whole number of at least 1."""
+    if isinstance(qty, bool):
+        return None
+    if isinstance(qty, float) and qty.is_integer():
+        qty = int(qty)
+    if isinstance(qty, int):
+        return qty if qty >= 1 else None
+    if isinstance(qty, str) and qty.strip().isdigit() and int(qty.strip()) >= 1:
+        return int(qty.strip())
+    return None
+
+
+class PricedLines:
+    """Result of PricingEngine.price_lines(), one array element per line."""
+    def __init__(self, lines, colors, qty, variant_prices, color_averages, supplements, unit_prices):
+        self.lines = lines
+        self.colors = colors
+        self.qty = qty
+        self.variant_prices = variant_prices
+        self.color_averages = color_averages
+        self.supplements = supplements
+        self.unit_prices = unit_prices
+        self.totals = unit_prices * qty
+
+    def __len__(self):
+        return len(self.lines)
+
+    def entries(self):
+        """Entry dictionaries as expected by PDFGenerator."""
+        unit_prices = self.unit_prices.tolist()
+        totals = self.totals.tolist()
+        # The quantity the total was computed with
+        qty = [int(value) for value in self.qty.tolist()]
+        return [
+            {
+                "model": line.get("model", ""),
+                "variant": line.get("variant", ""),
+                "qty": qty[i],
+                "colors": colors,
+                "unitPrice": unit_prices[i],
+                "total": totals[i]
+            }
+            for i, (line, colors) in enumerate(zip(self.lines, self.colors))
+        ]
+
+
+class PricingEngine:
+    """
+    Prices many order lines at once.
+
+    Each distinct (model, variant, colours) combination is looked up in the
+    catalogs only once, then unit prices, colour averages and supplements of all
+    lines come from array operations on the distinct combinations.
+    """
+    def __init__(self, registry=None, color_supplement=COLOR_SUPPLEMENT_PER_COLOR_DA_PRICE):
+        self.registry = registry or catalog
+        self.color_supplement = color_supplement
+        self._lock = threading.Lock()
+        # (model, variant, colours) -> (variant price, colour average, supplement)
+        self._cache = {}
+        self._cache_version = self.registry.version
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache = {}
+            self._cache_version = self.registry.version
+
+    def _price_combinations(self, combinations):
+        """
+        Computes the price components of combinations that are not memoized yet.
+
+        :return: Arrays (variant prices, colour averages, supplements)
+        """
+        n = len(combinations)
+        variant_prices = np.zeros(n)
+        # NaN marks an empty slot or a colour missing from the catalog
+        color_prices = np.full((n, MAX_COLORS), np.nan)
+        color_counts = np.zeros(n)
+
+        for i, (model, variant, colors) in enumerate(combinations):
+            variant_prices[i] = self.registry.price(model, variant, 0)
+            # colors holds at most MAX_COLORS names, see _price_lines
+            color_counts[i] = len(colors)
+            for j, color in enumerate(colors):
+                price = self.registry.price(COLORS, color)
+                if price is not None:
+                    color_prices[i, j] = price
+
+        known = ~np.isnan(color_prices)
+        known_counts = known.sum(axis=1)
+        sums = np.where(known, color_prices, 0.0).sum(axis=1)
+        # Avoid division by zero when no colour has a price
+        color_averages = np.divide(sums, known_counts, out=np.zeros(n), where=known_counts > 0)
+        supplements = color_counts * self.color_supplement
+        return variant_prices, color_averages, supplements
+
+    def problems(self, lines):
+        """
+        Checks order lines against the catalogs: model, variant and colours must
+        exist, the quantity must be a whole number of at least 1 and the colours a list.
+
+        :return: List of messages, empty when every line can be priced as written
+        """
+        problems = []
+        families = set(self.registry.families())
+        for line_no, line in enumerate(lines, start=1):
+            if not isinstance(line, dict):
+                problems.append(f"line {line_no}: not an object")
+                continue
+            model = line.get("model", "")
+            variant = line.get("variant", "")
+            if model not in families:
+                problems.append(f"line {line_no}: unknown model {model!r}")
+            elif not isinstance(variant, str) or self.registry.lookup(model, variant) is None:
+                problems.append(f"line {line_no}: unknown variant {variant!r} of {model}")
+            if strict_qty(line.get("qty", 1)) is None:
+                problems.append(f"line {line_no}: quantity {line.get('qty')!r} is not a whole number of at least 1")
+            colors = line.get("colors", [])
+            if not isinstance(colors, (list, tuple)):
+                problems.append(f"line {line_no}: colors must be a list, not {type(colors).__name__}")
+                continue
+            for color in colors:
+                if color and (not isinstance(color, str) or self.registry.lookup(COLORS, color) is None):
+                    problems.append(f"line {line_no}: unknown colour {color!r}")
+            if len([color for color in colors if color]) > MAX_COLORS:
+                problems.append(f"line {line_no}: more than {MAX_COLORS} colours")
+        return problems
+
+    def price_lines(self, lines):
+        """
+        Prices order lines.
+
+        :param lines: Iterable of dictionaries with model, variant, qty and colors (colours past MAX_COLORS are ignored)
+        :return: PricedLines
+        """
+        with metrics.timer("pricing"):
+            return self._price_lines(list(lines))
+
+    def _price_lines(self, lines):
+        if self._cache_version != self.registry.version:
+            # A catalog was reloaded, memoized prices may be stale
+            self.clear_cache()
+
+        colors = []
+        keys = []
+        for line in lines:
+            # removes empty colors, only the first MAX_COLORS are priced and shown
+            filtered = [color for color in line.get("colors", ()) if color][:MAX_COLORS]
+            colors.append(filtered)
+            keys.append((line.get("model", ""), line.get("variant", ""), tuple(filtered)))
+
+        # Index of every line into the list of distinct combinations
+        distinct = {}
+        inverse = np.fromiter((distinct.setdefault(key, len(distinct)) for key in keys), dtype=np.intp, count=len(keys))
+        combinations = list(distinct)
+
+        with self._lock:
+            found = {key: self._cache[key] for key in combinations if key in self._cache}
+        missing = [key for key in combinations if key not in found]
+        metrics.inc("pricing_lines_total", len(lines))
+        metrics.inc("pricing_cache_hits_total", len(found))
+        metrics.inc("pricing_cache_misses_total", len(missing))
+        if missing:
+            computed = dict(zip(missing, zip(*(array.tolist() for array in self._price_combinations(missing)))))
+            found.update(computed)
+            with self._lock:
+                if len(self._cache) + len(computed) > MAX_CACHED_COMBINATIONS:
+                    self._cache = {}
+                self._cache.update(computed)
+
+        components = np.array([found[key] for key in combinations], dtype=float).reshape(len(combinations), 3)
+        variant_prices, color_averages, supplements = (components[inverse, k] for k in range(3))
+        unit_prices = variant_prices + color_averages + supplements
+        qty = np.fromiter((parse_qty(line.get("qty", 1)) for line in lines), dtype=float, count=len(lines))
+        return PricedLines(lines, colors, qty, variant_prices, color_averages, supplements, unit_prices)
+
+
+# Process-wide engine sharing the memoized combinations
+engine = PricingEngine()
+
+
+def validate_lines(lines):
+    """Raises InvalidOrder listing every problem of the order lines, see PricingEngine.problems()."""
+    if not isinstance(lines, list):
+        raise InvalidOrder(f"lines must be a list, not {type(lines).__name__}")
+    problems = engine.problems(lines)
+    if problems:
+        raise InvalidOrder("Invalid order lines: " + "; ".join(problems))
+
+
+def price_entries(lines):
+    """Prices order lines and returns entry dictionaries as expected by PDFGenerator."""
+    return engine.price_lines(lines).entries()
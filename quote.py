@@ -0,0 +1,263 @@
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from pricing import price_entries, InvalidOrder
+from settings_store import get_store
+from metrics import metrics
+from numbering import get_allocator
+
+logger = logging.getLogger(__name__)
+
+
+# Personal details that must be filled before a quote can be generated
+REQUIRED_CLIENT_FIELDS = ["name", "addressLine1", "phone", "email", "nif", "nis", "rc", "article"]
+
+# Sections of invoice_data and the keys PDFGenerator reads from them
+INVOICE_DATA_KEYS = {
+    "header": ["companyName", "contactInfo"],
+    "invoiceDetails": ["invoiceTitle", "accountNo", "invoiceDate", "issueDate"],
+    "billTo": ["name", "addressLine1", "addressLine2", "email", "phone", "nif", "nis", "rc", "article"],
+    "paymentMethod": ["paymentMethod1"],
+    "totals": ["deliveryCost", "currencySign", "decimalPoint", "subTotal", "discountAmount", "taxAmount",
+               "total_ttc", "grandTotal"],
+    "thankYouMessage": ["heading", "notesLine1", "notesLine2"],
+    "signature": ["name", "fullName", "title"],
+}
+CONTACT_INFO_KEYS = ["addressLine1", "addressLine2", "phone", "email", "rc", "nif", "nis", "article"]
+ITEM_KEYS = ["model", "variant", "qty", "colors", "unitPrice", "total"]
+# Amounts printed with float()
+TOTAL_AMOUNTS = ["deliveryCost", "subTotal", "discountAmount", "taxAmount", "total_ttc", "grandTotal"]
+
+
+def load_settings(path="settings.json"):
+    """Returns the cached settings, re-read only when the file changed. None when there are no settings yet."""
+    return get_store(path).get()
+
+
+def price_entry(model, variant, qty, colors):
+    """
+    Prices one order line with the same rules as the GUI form, see pricing.py.
+
+    :param colors: Up to five color names, empty values are ignored
+    :return: Entry dictionary as expected by PDFGenerator
+    """
+    return price_entries([{"model": model, "variant": variant, "qty": qty, "colors": colors}])[0]
+
+
+def generate_invoice_number():
+    """Next sequential reference, e.g. 2026-000042, see numbering.py."""
+    return get_allocator().next()
+
+
+def release_invoice_number(invoice_data):
+    """Gives back the number of a quote that was not delivered, the next quote receives it."""
+    try:
+        get_allocator().release_references([invoice_data["invoiceDetails"]["accountNo"]])
+    except sqlite3.Error:
+        logger.exception("Could not give back quote number %s", invoice_data["invoiceDetails"]["accountNo"])
+
+
+def get_invoice_current_date():
+    return datetime.now().strftime("%d/%m/%Y")
+
+
+def get_invoice_validity(number=3, duration="month"):
+    #Default: 3 months ahead
+    try:
+        future_date = relativedelta(months=number)
+        if duration == "day":
+            future_date = relativedelta(days=number)
+        elif duration == "week":
+            future_date = relativedelta(weeks=number)
+        elif duration == "month":
+            future_date = relativedelta(months=number)
+        else: # year
+            future_date = relativedelta(years=number)
+        validity_date = datetime.now() + future_date
+        return validity_date.strftime("%d/%m/%Y")
+    except Exception as e:
+        logger.warning("Error in get_invoice_validity(): %s", e)
+        #Default: 3 months ahead when there is error
+        future_date = relativedelta(months=number)
+        validity_date = datetime.now() + future_date
+        return validity_date.strftime("%d/%m/%Y")
+
+
+def get_conversion_rates(settings, currency_sign="da"):
+    """
+    Returns the conversion rate from Dinar to the selected currency.
+    Base currency: Dinar
+    """
+    if currency_sign == "USD":
+        return settings["invoice"]["rate_USD"]
+    elif currency_sign == "EUR":
+        return settings["invoice"]["rate_EUR"]
+    else: # DA
+        return 1.0
+
+
+def default_logo_path():
+    # Dynamically return the logo path relative to the current working directory
+    return os.path.join(os.getcwd(), 'images', 'logo.png')
+
+
+def validate_order(client, entries):
+    """Raises InvalidOrder (a ValueError) with the same messages the GUI shows for incomplete orders."""
+    if not isinstance(client, dict):
+        raise InvalidOrder("client must be an object")
+    if not all(isinstance(client.get(field), str) and client[field].strip() for field in REQUIRED_CLIENT_FIELDS):
+        raise InvalidOrder("Please complete all personal details.")
+    if not entries:
+        raise InvalidOrder("Please add at least one entry.")
+    if any(not entry.get('model') for entry in entries):
+        raise InvalidOrder("One of entries has no selected model.")
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def validate_invoice_data(invoice_data):
+    """Raises InvalidOrder when invoice_data received from elsewhere misses something PDFGenerator reads."""
+    if not isinstance(invoice_data, dict):
+        raise InvalidOrder("invoice_data must be an object")
+    for section, keys in INVOICE_DATA_KEYS.items():
+        values = invoice_data.get(section)
+        if not isinstance(values, dict):
+            raise InvalidOrder(f"invoice_data.{section} must be an object")
+        missing = [key for key in keys if key not in values]
+        if missing:
+            raise InvalidOrder(f"Missing in invoice_data.{section}: {', '.join(missing)}")
+    contact_info = invoice_data["header"]["contactInfo"]
+    if not isinstance(contact_info, dict) or any(key not in contact_info for key in CONTACT_INFO_KEYS):
+        raise InvalidOrder(f"invoice_data.header.contactInfo must have {', '.join(CONTACT_INFO_KEYS)}")
+    if not all(_is_number(invoice_data["totals"][key]) for key in TOTAL_AMOUNTS):
+        raise InvalidOrder(f"invoice_data.totals {', '.join(TOTAL_AMOUNTS)} must be numbers")
+    items = invoice_data.get("items")
+    if not isinstance(items, list) or not items:
+        raise InvalidOrder("invoice_data.items must be a non-empty list")
+    for i, item in enumerate(items, start=1):
+        if (not isinstance(item, dict) or any(key not in item for key in ITEM_KEYS)
+                or not isinstance(item["colors"], list)
+                or not (_is_number(item["unitPrice"]) and _is_number(item["total"]))):
+            raise InvalidOrder(f"invoice_data.items[{i}] must have {', '.join(ITEM_KEYS)}, "
+                               f"colors as a list and numeric prices")
+
+
+def build_invoice_data(settings, client, entries, invoice_no=None, logo_path=None):
+    """
+    Builds the invoice_data dictionary rendered by PDFGenerator.
+
+    :param settings: Parsed settings.json
+    :param client: Bill-to details (name, addressLine1, addressLine2, phone, email, nif, nis, rc, article)
+    :param entries: Priced entries as returned by pricing.price_entries(), amounts in Dinar
+    :return: invoice_data with items and totals converted to the selected currency
+    """
+    validate_order(client, entries)
+
+    invoice = settings["invoice"]
+    currency_sign = invoice["currency"]
+    delivery_cost = invoice["deliveryCost"]
+
+    invoice_data = {
+        "header": {
+            "companyName": settings["company"]["companyName"],
+            "logoPath": logo_path or default_logo_path(),
+            "contactInfo": {
+                "addressLine1": settings["company"]["addressLine1"],
+                "addressLine2": settings["company"]["addressLine2"],
+                "phone": settings["company"]["phone"],
+                "website": "www.yourdomain.com",
+                "email": settings["company"]["email"],
+                "rc": settings["company"]["rc"],
+                "nif": settings["company"]["nif"],
+                "nis": settings["company"]["nis"],
+                "article": settings["company"]["article"]
+            }
+        },
+
+        "invoiceDetails": {
+            "invoiceTitle": invoice["title"],
+            "accountNo": invoice_no or generate_invoice_number(),
+            "invoiceDate": get_invoice_current_date(),
+            "issueDate": get_invoice_validity(invoice["validity"]["number"], invoice["validity"]["duration"])
+        },
+
+        "billTo": {
+            "name": client["name"].strip(),
+            "addressLine1": client["addressLine1"].strip(),
+            "addressLine2": client.get("addressLine2", "").strip(),
+            "email": client["email"].strip(),
+            "phone": client["phone"].strip(),
+            "nif": f"NIF: {client['nif'].strip()}",
+            "nis": f"NIS: {client['nis'].strip()}",
+            "rc": f"RC: {client['rc'].strip()}",
+            "article": f"Article: {client['article'].strip()}"
+        },
+
+        "items": entries,
+
+        "paymentMethod": {
+            "paymentMethod1": "   ".join(invoice["modeOfPayment"])
+        },
+
+        "totals": {
+            "deliveryCost": 0, # Will be calculated dynamically
+            "currencySign": currency_sign,
+            "decimalPoint": invoice["decimalPoint"],
+            "subTotal": 0, # Will be calculated dynamically
+            "discountPercent": invoice["discount"],
+            "discountAmount": 0, # Will be calculated dynamically
+            "taxPercent": invoice["tax"],
+            "taxAmount": 0, # Will be calculated dynamically
+            "grandTotal": 0 # Will be calculated dynamically
+        },
+
+        "thankYouMessage": {
+            "heading": settings["terms"]["termsLabel"],
+            "notesLine1": settings["terms"]["termsLine1"],
+            "notesLine2": settings["terms"]["termsLine2"]
+        },
+
+        "signature": {
+            "name": settings["signature"]["nameCursive"],
+            "fullName": settings["signature"]["fullName"],
+            "title": settings["signature"]["position"]
+        }
+    }
+
+    with metrics.timer("conversion"):
+        convert_totals(invoice_data, settings, entries, delivery_cost)
+    return invoice_data
+
+
+def convert_totals(invoice_data, settings, entries, delivery_cost):
+    """Computes the totals in Dinar and converts items and totals to the selected currency."""
+    currency_sign = invoice_data['totals']['currencySign']
+
+    # Recalculate totals based on items
+    totals = invoice_data['totals']
+    sub_total = sum(item['total'] for item in entries)
+    discount_amount = (totals['discountPercent'] / 100) * sub_total
+    tax_amount = (totals['taxPercent'] / 100) * sub_total
+    total_ttc = sub_total + tax_amount + delivery_cost
+    grand_total = total_ttc - discount_amount
+
+    # Convert the items and totals from DINAR to SELECTED CURRENCY
+    exchange_rate = get_conversion_rates(settings, currency_sign)
+    for entry in entries:
+        entry["unitPrice"] *= exchange_rate
+        entry["total"] *= exchange_rate
+
+    totals['subTotal'] = sub_total * exchange_rate
+    totals['discountAmount'] = discount_amount * exchange_rate
+    totals['taxAmount'] = tax_amount * exchange_rate
+    totals['total_ttc'] = total_ttc * exchange_rate
+    totals['grandTotal'] = grand_total * exchange_rate
+    totals['deliveryCost'] = delivery_cost * exchange_rate
@@ -0,0 +1,143 @@
+"""
+Background rendering of quotes for the GUI.
+
+Pricing, totals and PDF rendering run on a worker thread so the Tk window
+stays responsive. Quotes are rendered one after the other in the order they
+were submitted, and the outcome of each one is put on RenderQueue.results,
+which the GUI polls with root.after() (Tk widgets must only be touched from
+the main thread).
+
+A PDF is rendered into memory and only written once it is complete, so a
+cancelled quote never leaves a partial file behind. Written quotes are
+recorded in the archive given to RenderQueue, if any. A quote cancelled or
+failed after receiving its number gives the number back to the next quote.
+
+The rendering modules (reportlab, PIL, NumPy) are imported by the worker
+thread, not when this module is imported, so they do not delay the window.
+"""
+import itertools
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class RenderJob:
+    """One quote to render, built from values read on the main thread."""
+    def __init__(self, job_id, settings, client, lines, file_path):
+        self.job_id = job_id
+        self.settings = settings
+        self.client = client
+        self.lines = lines
+        self.file_path = file_path
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+
+class RenderQueue:
+    """
+    Worker thread rendering submitted quotes in order.
+
+    results receives one (job, error) tuple per finished job, error is None on
+    success and a JobCancelled instance for a cancelled job.
+    """
+    def __init__(self, archive=None):
+        """
+        :param archive: QuoteArchive recording the written quotes, None to keep no record
+        """
+        self.archive = archive
+        self.results = queue.Queue()
+        self._jobs = queue.Queue()
+        self._ids = itertools.count(1)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, settings, client, lines, file_path):
+        """
+        Queues a quote.
+
+        :param lines: Unpriced order lines (model, variant, qty, colors)
+        :return: RenderJob
+        """
+        job = RenderJob(next(self._ids), settings, client, lines, file_path)
+        with self._lock:
+            self._pending.append(job)
+        self._jobs.put(job)
+        return job
+
+    def pending(self):
+        """Number of quotes queued or rendering."""
+        with self._lock:
+            return len(self._pending)
+
+    def cancel_all(self):
+        """Cancels the quote being rendered and every queued one."""
+        with self._lock:
+            for job in self._pending:
+                job.cancel()
+
+    def stop(self):
+        self.cancel_all()
+        self._jobs.put(None)
+
+    def warm_up(self, func):
+        """Runs func on the worker thread before the next quotes, e.g. startup.warm_up."""
+        self._jobs.put(func)
+
+    def _render(self, job):
+        from create_pdf import PDFGenerator
+        from pricing import price_entries
+        from quote import build_invoice_data, release_invoice_number
+
+        job.check_cancelled()
+        entries = price_entries(job.lines)
+        job.check_cancelled()
+        invoice_data = build_invoice_data(job.settings, job.client, entries)
+        try:
+            job.check_cancelled()
+            pdf_bytes = PDFGenerator().create_pdf(invoice_data)
+            job.check_cancelled()
+            with open(job.file_path, "wb") as f:
+                f.write(pdf_bytes)
+        except Exception:
+            release_invoice_number(invoice_data)
+            raise
+        if self.archive is not None:
+            self.archive.record_safely(invoice_data, job.client, job.settings, job.file_path)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            if not isinstance(job, RenderJob):
+                try:
+                    job()
+                except Exception:
+                    logger.exception("Warm-up failed")
+                continue
+            try:
+                self._render(job)
+                error = None
+            except Exception as e:
+                error = e
+            with self._lock:
+                self._pending.remove(job)
+            self.results.put((job, error))
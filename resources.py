@@ -0,0 +1,14 @@
+import os
+import sys
+
+
+def get_base_path():
+    # If running as a PyInstaller bundle, use the temporary _MEIPASS path
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS  # PyInstaller extracts to this temp dir
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def resource_path(relative_path):
+    """Returns the absolute path of a bundled resource (fonts, images, CSV)."""
+    return os.path.join(get_base_path(), relative_path)
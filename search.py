@@ -0,0 +1,107 @@
+"""
+Type-ahead search over catalog names.
+
+The index is built once per catalog and keeps two sorted lists:
+    names:  (folded full name, position)  for 'starts with' matches
+    tokens: (folded word, position)       for matches on any word
+A keystroke only does a few bisect() calls on these lists, its cost grows
+with the number of matches and not with the size of the catalog.
+
+Matching ignores case and accents. Every word of the query must be the start
+of a word of the name: 'nabs 0,75' finds 'B1 Lav 12g + Nabs 0,75 g CB'.
+"""
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+
+# Sorts after every character a name can contain, ends the bisect prefix ranges
+_HIGHEST = "\U0010ffff"
+
+_TOKEN_RE = re.compile(r"[\w,.*]+")
+
+
+def fold(text):
+    """Lower case without accents: 'Carré  Bleu' -> 'carre  bleu'."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _prefix_range(sorted_pairs, prefix):
+    """Slice bounds of the (text, position) pairs whose text starts with prefix."""
+    start = bisect_left(sorted_pairs, (prefix,))
+    end = bisect_left(sorted_pairs, (prefix + _HIGHEST,), start)
+    return start, end
+
+
+class SearchIndex:
+    def __init__(self, names):
+        """
+        :param names: Display names, in the order used to break ties
+        """
+        self.names = list(names)
+        self._folded = [fold(name) for name in self.names]
+        name_tokens = [_TOKEN_RE.findall(folded) for folded in self._folded]
+        # ' w1 w2 w3': a word starts with q when ' ' + q is in the text
+        self._token_texts = [" " + " ".join(tokens) for tokens in name_tokens]
+        self._sorted_names = sorted((folded, i) for i, folded in enumerate(self._folded))
+        self._sorted_tokens = sorted(
+            (token, i) for i, tokens in enumerate(name_tokens) for token in set(tokens)
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def _token_hits(self, query_tokens, limit, exclude):
+        """Up to limit positions, in catalog order, whose words start with every query token."""
+        ranges = [_prefix_range(self._sorted_tokens, token) for token in query_tokens]
+        start, end = min(ranges, key=lambda r: r[1] - r[0])
+        rarest = end - start
+        if rarest == 0:
+            return []
+
+        spaced = [" " + token for token in query_tokens]
+        texts = self._token_texts
+        wanted = limit + len(exclude)
+        # Walking the catalog in order finds about one match every len/rarest names,
+        # that is cheaper than sorting the rarest token's matches when they are many
+        if wanted * len(self.names) < rarest * rarest:
+            hits = []
+            for i in range(len(self.names)):
+                if i not in exclude and all(q in texts[i] for q in spaced):
+                    hits.append(i)
+                    if len(hits) == limit:
+                        break
+            return hits
+
+        candidates = sorted({i for _, i in self._sorted_tokens[start:end]})
+        return [i for i in candidates if i not in exclude and all(q in texts[i] for q in spaced)][:limit]
+
+    def search(self, query, limit=50):
+        """
+        Returns up to limit names matching query, best first:
+        exact name, then names starting with the query, then names with a
+        word starting with each query word. Ties keep the catalog order.
+        An empty query returns the first names of the catalog.
+        """
+        query_folded = fold(query).strip()
+        if not query_folded:
+            return self.names[:limit]
+
+        # Exact names first: (query, position) pairs sort before (query, len(names))
+        start, end = _prefix_range(self._sorted_names, query_folded)
+        exact_end = bisect_left(self._sorted_names, (query_folded, len(self.names)), start, end)
+        prefix_hits = [i for _, i in self._sorted_names[start:exact_end]][:limit]
+        # Then the other names starting with the whole query
+        prefix_hits += heapq.nsmallest(limit - len(prefix_hits), (i for _, i in self._sorted_names[exact_end:end]))
+
+        query_tokens = _TOKEN_RE.findall(query_folded)
+        token_hits = []
+        if query_tokens and len(prefix_hits) < limit:
+            token_hits = self._token_hits(query_tokens, limit - len(prefix_hits), set(prefix_hits))
+
+        return [self.names[i] for i in prefix_hits + token_hits]
@@ -0,0 +1,314 @@
+"""
+Local HTTP quotation service.
+
+Renders quotes for other programs on the same host, without the GUI.
+Requests are rendered by a pool of worker processes that load the fonts,
+catalogs and settings once when the service starts.
+
+Endpoints:
+    POST /quote   body: invoice_data as built by the GUI (quote.build_invoice_data)
+    POST /order   body: {"client": {...}, "lines": [...], "reference": optional}
+                  same order format as batch.py, priced with the worker settings
+    GET  /health  pool size and number of requests in progress
+    GET  /metrics stage timings and counters, Prometheus text (?format=json for JSON)
+
+Both POST endpoints answer with the PDF (application/pdf). When the queue is
+full the service answers 503 with a Retry-After header instead of waiting.
+An order or invoice_data that cannot be rendered as sent (unknown catalog
+names, invalid quantities, missing fields) is answered 400, other failures 500.
+Rendered quotes are recorded in the quote archive (see archive.py) unless
+--no-archive is given. A quote identical to one already rendered is answered
+from the PDF cache (see pdf_cache.py) unless --no-cache is given.
+
+Usage:
+    python service.py --port 8765 --workers 4 --queue 32
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from archive import QuoteArchive, ARCHIVE_FILE
+from catalog import catalog
+from create_pdf import PDFGenerator, register_fonts
+from metrics import metrics, configure_logging
+from pdf_cache import PDFCache, CACHE_DIR, DEFAULT_MAX_MB
+from pricing import price_entries, validate_lines, InvalidOrder
+from quote import load_settings, build_invoice_data, release_invoice_number, validate_invoice_data
+
+logger = logging.getLogger(__name__)
+
+# Seconds a request may wait for its PDF before answering 504
+RENDER_TIMEOUT = 120
+
+# Settings loaded once per worker process
+_worker_settings = None
+# Archive connection of the worker process, None when archiving is off
+_worker_archive = None
+# PDF cache of the worker process, None when caching is off
+_worker_cache = None
+
+
+def _init_worker(settings, archive_path=None, cache_dir=None, cache_mb=DEFAULT_MAX_MB):
+    global _worker_settings, _worker_archive, _worker_cache
+    _worker_settings = settings
+    # Opened after the fork, a SQLite connection must not be shared between processes
+    if archive_path:
+        _worker_archive = QuoteArchive(archive_path)
+    if cache_dir:
+        _worker_cache = PDFCache(cache_dir, cache_mb * 1024 * 1024)
+    # Parse the TTF files and catalogs once per worker instead of once per request
+    register_fonts()
+    catalog.load_all()
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render_pdf(invoice_data):
+    if _worker_cache is not None:
+        return _worker_cache.render(invoice_data)
+    return PDFGenerator().create_pdf(invoice_data)
+
+
+def _render_invoice(invoice_data):
+    validate_invoice_data(invoice_data)
+    pdf_bytes = _render_pdf(invoice_data)
+    if _worker_archive is not None:
+        _worker_archive.record_safely(invoice_data)
+    return pdf_bytes
+
+
+def _render_order(order):
+    # Same checks as batch.py: unknown catalog names would be priced 0
+    validate_lines(order.get("lines", []))
+    entries = price_entries(order.get("lines", []))
+    invoice_data = build_invoice_data(_worker_settings, order.get("client", {}), entries,
+                                      invoice_no=order.get("reference"))
+    try:
+        pdf_bytes = _render_pdf(invoice_data)
+    except Exception:
+        if not order.get("reference"):
+            release_invoice_number(invoice_data)
+        raise
+    if _worker_archive is not None:
+        _worker_archive.record_safely(invoice_data, order.get("client", {}), _worker_settings)
+    return pdf_bytes
+
+
+def _run_render(render, payload):
+    """
+    Runs a render function in a worker process. The stage timings and the metrics
+    delta are recorded by the server process, also when the render failed.
+
+    :return: Tuple (pdf bytes, exception or None, stage timings, metrics delta)
+    """
+    with metrics.collect() as timings, metrics.collect_delta() as delta:
+        try:
+            pdf_bytes, error = render(payload), None
+        except Exception as e:
+            pdf_bytes, error = None, e
+    return pdf_bytes, error, timings, delta
+
+
+class QuoteRequestHandler(BaseHTTPRequestHandler):
+    routes = {
+        "/quote": _render_invoice,
+        "/order": _render_order,
+    }
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data, headers=None):
+        self._send(status, json.dumps(data).encode("utf-8"), headers=headers)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, metrics.to_prometheus().encode("utf-8"), content_type="text/plain; version=0.0.4")
+            return
+        if self.path == "/metrics?format=json":
+            self._send(200, metrics.to_json().encode("utf-8"))
+            return
+        if self.path != "/health":
+            self._send_json(404, {"error": "Not found"})
+            return
+        self._send_json(200, {
+            "workers": self.server.workers,
+            "inProgress": self.server.in_progress,
+            "queueSize": self.server.queue_size
+        })
+
+    def do_POST(self):
+        render = self.routes.get(self.path)
+        if render is None:
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "The body must be a JSON object"})
+            return
+
+        # Backpressure: refuse instead of queueing without limit
+        if not self.server.slots.acquire(blocking=False):
+            metrics.inc("service_requests_total", status="503")
+            self._send_json(503, {"error": "Too many requests in progress"}, headers={"Retry-After": "1"})
+            return
+        start = time.perf_counter()
+        self.server.track(1)
+        try:
+            future = self.server.executor.submit(_run_render, render, payload)
+        except Exception as e:
+            self.server.job_done()
+            logger.exception("Could not queue %s", self.path)
+            metrics.inc("service_requests_total", status="500")
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        # The slot is given back once the worker is done with the job, even after a timeout,
+        # so timed-out renders still count against queue_size
+        future.add_done_callback(lambda _: self.server.job_done())
+        try:
+            pdf_bytes, error, timings, delta = future.result(timeout=RENDER_TIMEOUT)
+            metrics.record_stages(timings)
+            metrics.merge(delta)
+            if error is not None:
+                raise error
+        except FutureTimeoutError:
+            metrics.inc("service_requests_total", status="504")
+            self._send_json(504, {"error": "Rendering timed out"})
+            return
+        except InvalidOrder as e:
+            # Incomplete order or invoice data, other errors are the service's
+            metrics.inc("service_requests_total", status="400")
+            self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:
+            logger.exception("Rendering %s failed", self.path)
+            metrics.inc("service_requests_total", status="500")
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        metrics.observe("service_request_seconds", time.perf_counter() - start)
+        metrics.inc("service_requests_total", status="200")
+        self._send(200, pdf_bytes, content_type="application/pdf")
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class QuoteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings, workers=None, queue_size=None, archive_path=None,
+                 cache_dir=None, cache_mb=DEFAULT_MAX_MB):
+        super().__init__(address, QuoteRequestHandler)
+        self.workers = workers or os.cpu_count()
+        # Requests rendering or waiting for a worker, at most queue_size
+        self.queue_size = queue_size or self.workers * 4
+        self.slots = threading.BoundedSemaphore(self.queue_size)
+        self.in_progress = 0
+        self._count_lock = threading.Lock()
+
+        # Warm up the parent first, so forked workers start with fonts and catalogs loaded
+        register_fonts()
+        catalog.load_all()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(settings, archive_path, cache_dir, cache_mb))
+        # Start every worker now instead of on the first requests
+        for future in [self.executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def track(self, delta):
+        with self._count_lock:
+            self.in_progress += delta
+
+    def job_done(self):
+        """Frees the slot of a request whose job left the pool."""
+        self.track(-1)
+        self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(cancel_futures=True)
+
+
+class QuoteClient:
+    """Small client for the quotation service."""
+    def __init__(self, host="127.0.0.1", port=8765, timeout=RENDER_TIMEOUT):
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def _post(self, path, data):
+        request = urllib.request.Request(self.base_url + path, data=json.dumps(data).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def render_invoice(self, invoice_data):
+        """Returns the PDF bytes of an invoice_data dictionary."""
+        return self._post("/quote", invoice_data)
+
+    def render_order(self, order):
+        """Returns the PDF bytes of an order (client and lines)."""
+        return self._post("/order", order)
+
+    def health(self):
+        with urllib.request.urlopen(self.base_url + "/health", timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve quotation PDFs over HTTP on this host.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default: 8765)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--queue", type=int, help="Maximum requests in progress (default: 4 per worker)")
+    parser.add_argument("--settings", default="settings.json", help="Settings file (default: settings.json)")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help=f"Quote archive (default: {ARCHIVE_FILE})")
+    parser.add_argument("--no-archive", action="store_true", help="Do not record the quotes in the archive")
+    parser.add_argument("--cache", default=CACHE_DIR, help=f"PDF cache folder (default: {CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_MB,
+                        help=f"PDF cache size in MB (default: {DEFAULT_MAX_MB})")
+    parser.add_argument("--no-cache", action="store_true", help="Render every request, ignoring the PDF cache")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR (default: $QUOTE_LOG_LEVEL or INFO)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    settings = load_settings(args.settings)
+    if settings is None:
+        print(f"Settings file not found: {args.settings}")
+        return 2
+
+    archive_path = None if args.no_archive else args.archive
+    server = QuoteServer((args.host, args.port), settings, workers=args.workers, queue_size=args.queue,
+                         archive_path=archive_path, cache_dir=None if args.no_cache else args.cache,
+                         cache_mb=args.cache_size)
+    print(f"Quotation service listening on http://{args.host}:{args.port} with {server.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
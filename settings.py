@@ -1,8 +1,8 @@
 import shutil
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import json
 import os
+from settings_store import settings_store
 
 
 class Settings:
@@ -248,9 +248,12 @@ class Settings:
             }
         }
 
-        # Save to file
-        with open("settings.json", "w") as f:
-            json.dump(data, f, indent=4)
+        # Save to file, the GUI and renderer are notified by the store
+        try:
+            settings_store.save(data)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to save settings:\n{str(e)}")
+            return
 
         messagebox.showinfo("Settings Saved", "Settings successfully saved!")
         self.window.destroy()
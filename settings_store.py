@@ -0,0 +1,169 @@
+"""
+In-memory settings store.
+
+settings.json is parsed and validated once and kept in memory. get() only
+calls stat() on the file and re-parses it when it was changed by another
+program. save() writes a temporary file next to settings.json and renames it
+over the old one, so a reader sees either the old or the new file, never a
+half-written one.
+
+The settings dictionary returned by get() must be treated as read-only: a
+save or reload replaces it as a whole, so a reference kept by a render job is
+a consistent snapshot.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_FILE = "settings.json"
+
+# Section -> keys build_invoice_data() needs
+REQUIRED_SETTINGS = {
+    "company": ["companyName", "addressLine1", "addressLine2", "phone", "email", "rc", "nif", "nis", "article"],
+    "invoice": ["title", "validity", "modeOfPayment", "currency", "decimalPoint",
+                "tax", "discount", "deliveryCost", "rate_EUR", "rate_USD"],
+    "terms": ["termsLabel", "termsLine1", "termsLine2"],
+    "signature": ["nameCursive", "fullName", "position"],
+}
+NUMERIC_INVOICE_SETTINGS = ["tax", "discount", "deliveryCost", "rate_EUR", "rate_USD"]
+
+
+def validate_settings(data):
+    """Raises ValueError describing the first missing or invalid setting."""
+    if not isinstance(data, dict):
+        raise ValueError("Settings must be a JSON object")
+    for section, keys in REQUIRED_SETTINGS.items():
+        values = data.get(section)
+        if not isinstance(values, dict):
+            raise ValueError(f"Missing settings section: {section}")
+        for key in keys:
+            if key not in values:
+                raise ValueError(f"Missing setting: {section}.{key}")
+
+    invoice = data["invoice"]
+    for key in NUMERIC_INVOICE_SETTINGS:
+        if isinstance(invoice[key], bool) or not isinstance(invoice[key], (int, float)):
+            raise ValueError(f"Setting invoice.{key} must be a number, not {invoice[key]!r}")
+    validity = invoice["validity"]
+    if not isinstance(validity, dict) or not isinstance(validity.get("number"), int) or "duration" not in validity:
+        raise ValueError("Setting invoice.validity must have an integer number and a duration")
+
+
+class SettingsStore:
+    def __init__(self, path=SETTINGS_FILE):
+        self.path = path
+        self._settings = None
+        self._fingerprint = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        # Incremented every time the settings are replaced
+        self.version = 0
+
+    def add_listener(self, callback):
+        """callback(settings) is called after the settings were saved or reloaded."""
+        self._listeners.append(callback)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _notify(self, settings):
+        for callback in self._listeners:
+            callback(settings)
+
+    def _reload(self, fingerprint):
+        """Parses the file, keeps the previous settings if it is unreadable or invalid."""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            validate_settings(data)
+        except (OSError, ValueError) as e:
+            logger.error("Loading settings from %s failed: %s", self.path, e)
+            # Do not retry until the file changes again
+            self._fingerprint = fingerprint
+            return False
+        self._settings = data
+        self._fingerprint = fingerprint
+        self.version += 1
+        return True
+
+    def check_for_updates(self):
+        """
+        Reloads the settings when the file changed since it was read.
+
+        :return: True when the settings were reloaded
+        """
+        with self._lock:
+            fingerprint = self._stat()
+            if fingerprint is None or fingerprint == self._fingerprint:
+                return False
+            reloaded = self._reload(fingerprint)
+            settings = self._settings
+        if reloaded:
+            self._notify(settings)
+        return reloaded
+
+    def get(self):
+        """
+        Returns the parsed settings, None when there is no settings file yet.
+        Costs a stat() call unless the file changed.
+        """
+        with metrics.timer("settings_load"):
+            self.check_for_updates()
+            return self._settings
+
+    def save(self, data):
+        """
+        Validates and atomically writes the settings, then notifies the listeners.
+        Raises ValueError for invalid settings, the file is then left untouched.
+        """
+        validate_settings(data)
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # mkstemp creates the file readable by its owner only, keep the old permissions
+                if os.path.exists(self.path):
+                    shutil.copymode(self.path, temp_path)
+                else:
+                    os.chmod(temp_path, 0o644)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self._settings = data
+            self._fingerprint = self._stat()
+            self.version += 1
+        self._notify(data)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=SETTINGS_FILE):
+    """Returns the process-wide store of a settings file."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SettingsStore(path)
+        return store
+
+
+# Store of the default settings.json
+settings_store = get_store()
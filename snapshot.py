@@ -0,0 +1,216 @@
+"""
+Precompiled binary snapshots of the CSV catalogs.
+
+A snapshot is written next to its CSV file (CSV/.snapshots/<file>.snap) the
+first time the CSV is parsed, and memory-mapped on the next launches instead
+of parsing the CSV again. Opening a snapshot reads no rows: names, keys and
+prices are read from the mapping when they are used, and a lookup is a
+binary search over the keys stored in sorted order.
+
+Layout (native byte order, arrays 8-byte aligned):
+    header      magic, byte order, source CSV size / mtime_ns / sha1,
+                entry count, size of the string and error blocks, CRC32 of the body
+    prices      float64[count]
+    name_offs   uint32[count + 1]   display names in file order
+    key_offs    uint32[count + 1]   normalized names in file order
+    sorted      uint32[count]       entry indexes sorted by key bytes
+    strings     UTF-8 names and keys
+    errors      JSON list of the rows that were rejected while parsing
+
+A snapshot is used when the CSV still has the recorded size and mtime, or
+when its SHA-1 is unchanged. Otherwise, or when the CRC does not match, the
+catalog is parsed from the CSV and the snapshot rebuilt.
+
+Run `python snapshot.py` to compile every catalog ahead of time, e.g. before
+bundling the application.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QCATSNP1"
+SNAPSHOT_DIR = ".snapshots"
+BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+# magic, byte order, source size, source mtime_ns, source sha1, count, strings size, errors size, body crc32
+HEADER = struct.Struct("=8sBxxxQq20sIIII")
+HEADER_SIZE = (HEADER.size + 7) // 8 * 8
+
+
+def snapshot_path(csv_path):
+    directory, file_name = os.path.split(csv_path)
+    return os.path.join(directory, SNAPSHOT_DIR, file_name + ".snap")
+
+
+def _align(size):
+    return (size + 7) // 8 * 8
+
+
+class CatalogSnapshot:
+    """Read-only view over a memory-mapped snapshot file."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self._map) < HEADER_SIZE:
+            raise ValueError("truncated snapshot")
+        (magic, byte_order, self.source_size, self.source_mtime_ns, source_sha1,
+         self.count, strings_size, errors_size, crc) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or byte_order != BYTE_ORDER:
+            raise ValueError("not a snapshot of this format")
+        self.source_sha1 = source_sha1.hex()
+
+        count = self.count
+        prices_start = HEADER_SIZE
+        names_start = prices_start + 8 * count
+        keys_start = names_start + _align(4 * (count + 1))
+        sorted_start = keys_start + _align(4 * (count + 1))
+        self._strings_start = sorted_start + _align(4 * count)
+        errors_start = self._strings_start + strings_size
+        if len(self._map) != errors_start + errors_size:
+            raise ValueError("truncated snapshot")
+
+        view = memoryview(self._map)
+        self._views = [view]
+        if zlib.crc32(view[HEADER_SIZE:]) != crc:
+            raise ValueError("checksum mismatch")
+        self.prices = view[prices_start:names_start].cast("d")
+        self._name_offsets = view[names_start:names_start + 4 * (count + 1)].cast("I")
+        self._key_offsets = view[keys_start:keys_start + 4 * (count + 1)].cast("I")
+        self._sorted = view[sorted_start:sorted_start + 4 * count].cast("I")
+        self._views += [self.prices, self._name_offsets, self._key_offsets, self._sorted]
+        self._errors_block = (errors_start, errors_start + errors_size)
+
+    def close(self):
+        # Views must be released before the mapping can be closed
+        for view in reversed(getattr(self, "_views", [])):
+            view.release()
+        self._views = []
+        self._map.close()
+
+    def _string(self, offsets, i):
+        start = self._strings_start
+        return self._map[start + offsets[i]:start + offsets[i + 1]]
+
+    def name(self, i):
+        return self._string(self._name_offsets, i).decode("utf-8")
+
+    def key(self, i):
+        return self._string(self._key_offsets, i).decode("utf-8")
+
+    def names(self):
+        return [self.name(i) for i in range(self.count)]
+
+    def errors(self):
+        start, end = self._errors_block
+        return json.loads(self._map[start:end].decode("utf-8"))
+
+    def find(self, key):
+        """Index of the entry with this normalized name, None when absent."""
+        target = key.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            index = self._sorted[middle]
+            current = self._string(self._key_offsets, index)
+            if current < target:
+                low = middle + 1
+            elif current > target:
+                high = middle
+            else:
+                return index
+        return None
+
+
+def write_snapshot(path, entries, errors, source_size, source_mtime_ns, source_sha1):
+    """
+    Writes a snapshot atomically (temporary file renamed over the old one).
+
+    :param entries: CatalogEntry objects in file order
+    """
+    entries = list(entries)
+    count = len(entries)
+    strings = bytearray()
+    name_offsets = []
+    key_offsets = []
+    for entry in entries:
+        name_offsets.append(len(strings))
+        strings += entry.name.encode("utf-8")
+    name_offsets.append(len(strings))
+    encoded_keys = []
+    for entry in entries:
+        key_offsets.append(len(strings))
+        encoded = entry.key.encode("utf-8")
+        encoded_keys.append(encoded)
+        strings += encoded
+    key_offsets.append(len(strings))
+    sorted_indexes = sorted(range(count), key=encoded_keys.__getitem__)
+
+    def padded(data):
+        return data + b"\0" * (_align(len(data)) - len(data))
+
+    errors_block = json.dumps(errors).encode("utf-8")
+    body = b"".join([
+        struct.pack(f"={count}d", *(entry.price for entry in entries)),
+        padded(struct.pack(f"={count + 1}I", *name_offsets)),
+        padded(struct.pack(f"={count + 1}I", *key_offsets)),
+        padded(struct.pack(f"={count}I", *sorted_indexes)),
+        bytes(strings),
+        errors_block,
+    ])
+    header = HEADER.pack(MAGIC, BYTE_ORDER, source_size, source_mtime_ns, bytes.fromhex(source_sha1),
+                         count, len(strings), len(errors_block), zlib.crc32(body))
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(header.ljust(HEADER_SIZE, b"\0"))
+            file.write(body)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def open_snapshot(path):
+    """Returns a CatalogSnapshot, None when it is missing or unreadable."""
+    try:
+        return CatalogSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning("Ignoring snapshot %s: %s", path, e)
+        return None
+
+
+def main():
+    """Compiles every catalog into its snapshot."""
+    from catalog import CatalogRegistry, COLORS
+    logging.basicConfig(level=logging.INFO)
+    registry = CatalogRegistry()
+    for name in registry.families() + [COLORS]:
+        loaded = registry.get(name)
+        print(f"{name}: {len(loaded)} references -> {snapshot_path(registry.source_path(name))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Startup timing report.
+
+main.py imports this module first, every mark() is then measured from the
+start of the process. The GUI only imports what it needs to draw the window;
+reportlab, PIL, NumPy and the catalogs are loaded by warm_up() on a
+background thread once the window is shown, each step is timed here.
+
+report() is logged once the warm-up finished, and a warning is logged when
+the window took longer than STARTUP_BUDGET_SECONDS to appear. For a full
+import breakdown run: python -X importtime main.py
+"""
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+START = time.perf_counter()
+
+# Time allowed between process start and the first idle window
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Modules imported in the background, heaviest first
+DEFERRED_MODULES = ["numpy", "reportlab.pdfgen.canvas", "PIL.Image", "pricing", "create_pdf", "quote"]
+
+_lock = threading.Lock()
+# (name, seconds since start)
+_marks = []
+# (step, seconds it took)
+_steps = []
+
+
+def elapsed():
+    return time.perf_counter() - START
+
+
+def mark(name):
+    """Records that a startup milestone was reached."""
+    with _lock:
+        _marks.append((name, elapsed()))
+
+
+@contextmanager
+def timed(step):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _steps.append((step, time.perf_counter() - start))
+
+
+def timed_import(module_name):
+    with timed(f"import {module_name}"):
+        return importlib.import_module(module_name)
+
+
+def warm_up():
+    """Imports the rendering modules and loads fonts and catalogs, see RenderQueue."""
+    for module_name in DEFERRED_MODULES:
+        timed_import(module_name)
+    from create_pdf import register_fonts
+    from catalog import catalog
+    with timed("register fonts"):
+        register_fonts()
+    with timed("load catalogs"):
+        catalog.load_all()
+    mark("warm-up done")
+    logger.info(report())
+
+
+def report():
+    """Human-readable startup timings."""
+    with _lock:
+        marks = list(_marks)
+        steps = list(_steps)
+    lines = ["Startup timings:"]
+    lines += [f"  {name:<32}{seconds * 1000:>9.1f} ms after start" for name, seconds in marks]
+    if steps:
+        lines.append("Background warm-up:")
+        lines += [f"  {step:<32}{seconds * 1000:>9.1f} ms" for step, seconds in steps]
+    return "\n".join(lines)
+
+
+def check_budget(milestone="window ready"):
+    """Logs a warning when a milestone was reached after STARTUP_BUDGET_SECONDS."""
+    with _lock:
+        seconds = next((s for name, s in _marks if name == milestone), None)
+    if seconds is not None and seconds > STARTUP_BUDGET_SECONDS:
+        logger.warning("Startup over budget: %s after %.2fs (budget %.2fs)",
+                       milestone, seconds, STARTUP_BUDGET_SECONDS)